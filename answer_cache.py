@@ -0,0 +1,127 @@
+# answer_cache.py
+from collections import OrderedDict
+import re
+import threading
+import time
+
+import numpy as np
+
+
+def normalize_query(query: str) -> str:
+    return re.sub(r"\s+", " ", query).strip().lower().rstrip("?!. ")
+
+
+def files_key(target_files) -> tuple:
+    return tuple(sorted(set(target_files or [])))
+
+
+class AnswerCache:
+    """TTL/LRU cache of /chat results keyed on query and target file set.
+
+    Lookups first try the normalized query text; if ``semantic_threshold``
+    is set, a second tier matches earlier queries over the same files whose
+    vectors have cosine similarity at or above the threshold. An empty file
+    set means "all documents" and is invalidated by a change to any file.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 3600,
+                 semantic_threshold: float = 0.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.semantic_threshold = semantic_threshold
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def generation(self) -> int:
+        """Token to pass to put() so results computed across an invalidation are dropped."""
+        with self._lock:
+            return self._generation
+
+    def _live(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry["created"] > self.ttl_seconds:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def get(self, query: str, target_files):
+        key = (normalize_query(query), files_key(target_files))
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                if not self.semantic_threshold:
+                    self.misses += 1
+                return None
+            self.hits += 1
+            return entry["value"]
+
+    def get_semantic(self, query_vector, target_files):
+        if not self.semantic_threshold:
+            return None
+
+        files = files_key(target_files)
+        with self._lock:
+            keys = [k for k in self._entries if k[1] == files]
+            keys = [k for k in keys if self._live(k) is not None]
+            if not keys:
+                self.misses += 1
+                return None
+
+            matrix = np.stack([self._entries[k]["vector"] for k in keys])
+            vector = np.array(query_vector, dtype=np.float32)
+            vector /= np.linalg.norm(vector) or 1.0
+            scores = matrix @ vector
+            best = int(np.argmax(scores))
+            if scores[best] < self.semantic_threshold:
+                self.misses += 1
+                return None
+
+            self.semantic_hits += 1
+            self._entries.move_to_end(keys[best])
+            return self._entries[keys[best]]["value"]
+
+    def put(self, query: str, target_files, query_vector, value, generation: int):
+        vector = np.array(query_vector, dtype=np.float32)
+        vector /= np.linalg.norm(vector) or 1.0
+        key = (normalize_query(query), files_key(target_files))
+
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = {
+                "value": value,
+                "vector": vector,
+                "created": time.monotonic()
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_file(self, filename: str):
+        with self._lock:
+            self._generation += 1
+            stale = [k for k in self._entries if not k[1] or filename in k[1]]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.semantic_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.semantic_hits) / total, 4) if total else 0.0
+        }
@@ -1,30 +1,41 @@
 #ap.py
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request, stream_with_context
 from flask_cors import CORS
-from extractor import (
-    extract_text_from_pdf,
-    extract_text_from_docx,
-    extract_text_from_txt,
-    extract_text_from_csv,
-    extract_text_from_json,
-    extract_text_from_xlsx
-)
+from extractor import EXTRACTORS, get_extractor, start_pdf_pool
+from pipeline import batched, chunk_sections, prefetch
+from qdrant_writer import BatchedWriter
 
 from qdrant_client import QdrantClient, models
 from qdrant_client.http.models import Filter, FieldCondition, MatchAny
-from embeddings import embeddings
+from answer_cache import AnswerCache
+from chunk_store import ChunkStore
+from context_builder import build_context
+from jobs import JobQueue, JobStore, SwapLock, lock_folder
+from lazy import Lazy, warm_up
+from metrics import Timings, metrics
+from microbatch import MicroBatcher
+from manifest import ChunkManifest, chunk_hash, chunk_point_id
+from registry import DocumentRegistry
+from uploads import UploadError, UploadStore
+from provisioning import ensure_collection, search_params
+from reranker import RERANK_ADAPTIVE
+from sparse import SPARSE_VECTOR_NAME
+from sparse import document_vector as sparse_document_vector
+from sparse import query_vector as sparse_query_vector
 
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from sentence_transformers import CrossEncoder
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
 
 import os
-import uuid
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 import json
 import logging
-import openai
+import threading
+import time
+import uuid
 from datetime import datetime
+from types import SimpleNamespace
 
 #APP INIT 
 app = Flask(__name__)
@@ -32,46 +43,323 @@ CORS(app)
 
 load_dotenv()
 
+# Forked here, before the batchers, job queue and warm-up start threads
+start_pdf_pool()
+
+# Chats slower than this are logged with their stage breakdown (0 = never)
+SLOW_CHAT_MS = float(os.getenv("SLOW_CHAT_MS", "5000"))
+
 QDRANT_URL = os.getenv("QDRANT_URL")
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+# Embedded Qdrant (":memory:" or a directory) instead of a server, e.g. for
+# the offline benchmarks
+QDRANT_PATH = os.getenv("QDRANT_PATH")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-if not all([QDRANT_URL, QDRANT_API_KEY, OPENAI_API_KEY]):
+if not OPENAI_API_KEY or not (QDRANT_PATH or (QDRANT_URL and QDRANT_API_KEY)):
     raise ValueError("Missing environment variables")
 
+# Seconds before a Qdrant or LLM call is abandoned
+QDRANT_TIMEOUT = int(os.getenv("QDRANT_TIMEOUT", "30"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+
+CHAT_COMPLETION = {
+    "model": os.getenv("CHAT_MODEL", "gpt-4o-mini"),
+    "temperature": 0.3,
+    "max_tokens": 800
+}
+
 #QDRANT
-qdrant_client = QdrantClient(
-    url=QDRANT_URL,
-    api_key=QDRANT_API_KEY,
-    check_compatibility=False
-)
+# Constructing the client doesn't contact the server
+if QDRANT_PATH == ":memory:":
+    qdrant_client = QdrantClient(location=":memory:")
+elif QDRANT_PATH:
+    qdrant_client = QdrantClient(path=QDRANT_PATH)
+else:
+    qdrant_client = QdrantClient(
+        url=QDRANT_URL,
+        api_key=QDRANT_API_KEY,
+        timeout=QDRANT_TIMEOUT,
+        check_compatibility=False
+    )
 
-COLLECTION_NAME = "Document"
+COLLECTION_NAME = os.getenv("COLLECTION_NAME", "Document")
 
 
-if not qdrant_client.collection_exists(COLLECTION_NAME):
-    qdrant_client.create_collection(
+# Hybrid retrieval: BM25-style sparse vectors next to the dense vector
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1") == "1"
+HYBRID_PREFETCH = int(os.getenv("HYBRID_PREFETCH", "30"))
+
+# Changing these only affects new uploads; rebuild existing documents with
+# reindex.py using the same values
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+
+RERANK_KEEP = int(os.getenv("RERANK_KEEP", "10"))
+
+
+#LAZY COMPONENTS
+# Models, clients and the collection check are built on first use or by the
+# warm-up thread, so importing the app is fast and never touches the network
+def load_embeddings():
+    from embeddings import embeddings as wrapper
+    # Loads the local model or opens the API connection pool
+    wrapper.embed_query("warmup")
+    return wrapper
+
+
+def check_embedding_backend(collection_params, wrapper):
+    """Refuse to use the collection if it holds vectors from another backend."""
+    vectors = collection_params.vectors
+    if isinstance(vectors, dict):
+        vectors = vectors.get("")
+    if vectors is not None and vectors.size != wrapper.embedding_size:
+        raise ValueError(
+            f"Collection {COLLECTION_NAME} stores {vectors.size}-dim vectors but the "
+            f"'{wrapper.signature}' embedding backend produces "
+            f"{wrapper.embedding_size}-dim vectors"
+        )
+
+    points, _ = qdrant_client.scroll(
         collection_name=COLLECTION_NAME,
-        vectors_config=models.VectorParams(
-            size=embeddings.embedding_size,
-            distance=models.Distance.COSINE
+        with_payload=["embedding_model"],
+        with_vectors=False,
+        limit=1
+    )
+    if points:
+        # Points written before backends were pluggable came from OpenAI
+        stored = (points[0].payload or {}).get(
+            "embedding_model", "openai:text-embedding-3-small:1536"
         )
+        if stored != wrapper.signature:
+            raise ValueError(
+                f"Collection {COLLECTION_NAME} was built with '{stored}', "
+                f"refusing to mix in '{wrapper.signature}' embeddings"
+            )
+
+
+def prepare_collection():
+    """Create and validate the collection; returns the retrieval settings."""
+    wrapper = embeddings.get()
+    ensure_collection(
+        qdrant_client,
+        COLLECTION_NAME,
+        vector_size=wrapper.embedding_size,
+        hybrid=HYBRID_SEARCH
+    )
+    collection_params = qdrant_client.get_collection(COLLECTION_NAME).config.params
+    check_embedding_backend(collection_params, wrapper)
+
+    hybrid = HYBRID_SEARCH and SPARSE_VECTOR_NAME in (
+        collection_params.sparse_vectors or {}
+    )
+    if HYBRID_SEARCH and not hybrid:
+        logging.warning(
+            "Collection %s has no '%s' sparse vectors; using dense-only search "
+            "until it is re-created", COLLECTION_NAME, SPARSE_VECTOR_NAME
+        )
+
+    return {
+        "hybrid": hybrid,
+        # First-stage hits sent to the reranker; hybrid retrieval is
+        # precise enough to rerank fewer candidates
+        "rerank_candidates": int(os.getenv("RERANK_CANDIDATES", "8" if hybrid else "20"))
+    }
+
+
+def load_text_splitter():
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP
     )
 
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=1000,
-    chunk_overlap=200
+
+def load_reranker():
+    from reranker import Reranker
+    model = Reranker()
+    # A dummy pair so the first query doesn't pay for session setup
+    model.predict([("warmup", "warmup")])
+    return model
+
+
+def load_llm():
+    import openai
+    return openai.OpenAI(
+        api_key=OPENAI_API_KEY,
+        timeout=LLM_TIMEOUT,
+        max_retries=LLM_MAX_RETRIES
+    )
+
+
+embeddings = Lazy("embeddings", load_embeddings)
+collection = Lazy("collection", prepare_collection)
+text_splitter = Lazy("text_splitter", load_text_splitter)
+reranker = Lazy("reranker", load_reranker)
+llm = Lazy("llm", load_llm)
+
+# Warm-up order; the collection check needs the embedding size
+COMPONENTS = [embeddings, collection, text_splitter, reranker, llm]
+
+
+#MICRO-BATCHING
+# Concurrent chats share one embedding call and one CrossEncoder pass.
+# A request waits at most the window for others to join; a batch size of
+# 1 turns batching off.
+QUERY_EMBED_BATCH_WINDOW_MS = float(os.getenv("QUERY_EMBED_BATCH_WINDOW_MS", "5"))
+QUERY_EMBED_BATCH_SIZE = int(os.getenv("QUERY_EMBED_BATCH_SIZE", "32"))
+# Local models are CPU-bound; remote embedding calls can overlap
+QUERY_EMBED_BATCH_WORKERS = int(os.getenv(
+    "QUERY_EMBED_BATCH_WORKERS",
+    "1" if os.getenv("EMBEDDING_BACKEND", "openai") == "local" else "4"
+))
+RERANK_BATCH_WINDOW_MS = float(os.getenv("RERANK_BATCH_WINDOW_MS", "5"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+
+
+def embed_query_batch(queries):
+    return embeddings.get().embed_documents(queries)
+
+
+def rerank_batch(jobs):
+    return reranker.get().rerank_many(jobs)
+
+
+query_embedder = MicroBatcher(
+    embed_query_batch,
+    window_ms=QUERY_EMBED_BATCH_WINDOW_MS,
+    max_batch=QUERY_EMBED_BATCH_SIZE,
+    workers=QUERY_EMBED_BATCH_WORKERS,
+    name="embed-query"
+)
+rerank_batcher = MicroBatcher(
+    rerank_batch,
+    window_ms=RERANK_BATCH_WINDOW_MS,
+    max_batch=RERANK_BATCH_SIZE,
+    name="rerank"
 )
 
-reranker = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
+#CHUNK MANIFEST
+manifest = ChunkManifest(os.getenv("MANIFEST_PATH", "data/manifest.sqlite3"))
+
+#DOCUMENT REGISTRY
+registry = DocumentRegistry(os.getenv("REGISTRY_PATH", "data/registry.sqlite3"))
+
+#CHUNK STORE
+# Optional: chunk text lives in a local memory-mapped store and Qdrant
+# payloads keep only what searches filter on or return
+CHUNK_STORE = os.getenv("CHUNK_STORE", "0") == "1"
+chunk_store = ChunkStore(
+    os.getenv("CHUNK_STORE_PATH", "data/chunks"),
+    compress=os.getenv("CHUNK_STORE_COMPRESS", "0") == "1"
+) if CHUNK_STORE else None
+# Payload fields fetched with search hits
+SEARCH_PAYLOAD = ["filename", "page"] if CHUNK_STORE else ["text", "filename", "page"]
+
+#ANSWER CACHE
+answer_cache = AnswerCache(
+    max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "1000")),
+    ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL", "3600")),
+    semantic_threshold=float(os.getenv("ANSWER_CACHE_SEMANTIC_THRESHOLD", "0"))
+)
 
 #FILES
-UPLOAD_FOLDER = "uploaded_files"
+# Ingested files are kept here so reindex.py can rebuild the collection
+UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", "uploaded_files")
 TEMP_FOLDER = "temp_uploads"
+KEEP_SOURCES = os.getenv("KEEP_SOURCES", "1") == "1"
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(TEMP_FOLDER, exist_ok=True)
 
+#METRICS
+@app.before_request
+def start_request_metrics():
+    g.request_start = time.perf_counter()
+    metrics.gauge_add(
+        "rag_requests_in_flight", 1, "Requests currently being served",
+        endpoint=request.endpoint or "unknown"
+    )
+
+
+@app.after_request
+def count_request(response):
+    metrics.inc(
+        "rag_requests_total", 1, "Requests served, by endpoint and status",
+        endpoint=request.endpoint or "unknown", status=response.status_code
+    )
+    return response
+
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    if "request_start" not in g:
+        return
+    endpoint = request.endpoint or "unknown"
+    metrics.gauge_add("rag_requests_in_flight", -1, endpoint=endpoint)
+    metrics.observe(
+        "rag_request_seconds", time.perf_counter() - g.request_start,
+        "Request latency, by endpoint", endpoint=endpoint
+    )
+
+
+def cache_samples():
+    """Hit/miss counters and hit ratios of the caches, read at scrape time."""
+    caches = {"answer": answer_cache.stats()}
+    if embeddings.ready and embeddings.get().cache is not None:
+        caches["embedding"] = embeddings.get().cache.stats()
+    if reranker.ready:
+        caches["rerank"] = reranker.get().stats()
+
+    samples = []
+    for cache, stats in caches.items():
+        hits = stats.get("cache_hits", stats.get("hits", 0)) + stats.get("semantic_hits", 0)
+        misses = stats.get("cache_misses", stats.get("misses", 0))
+        samples += [
+            ("rag_cache_hits_total", "counter", "Cache hits", {"cache": cache}, hits),
+            ("rag_cache_misses_total", "counter", "Cache misses", {"cache": cache}, misses),
+            ("rag_cache_hit_ratio", "gauge", "Cache hit ratio since start",
+             {"cache": cache}, stats.get("cache_hit_rate", stats.get("hit_rate", 0.0))),
+        ]
+    for name, batcher in (("embed_query", query_embedder), ("rerank", rerank_batcher)):
+        samples.append((
+            "rag_microbatch_mean_size", "gauge", "Mean micro-batch size since start",
+            {"batcher": name}, batcher.stats()["mean_batch_size"]
+        ))
+    return samples
+
+
+metrics.register_collector(cache_samples)
+
+
+def record_token_usage(usage):
+    if usage is None:
+        return
+    help_text = "LLM tokens used, from the completion responses"
+    metrics.inc("rag_llm_tokens_total", usage.prompt_tokens or 0, help_text, type="prompt")
+    metrics.inc("rag_llm_tokens_total", usage.completion_tokens or 0, help_text, type="completion")
+
+
+def finish_timings(timings, result, include):
+    """Record stage timings; adds the breakdown to ``result`` when asked for."""
+    breakdown = timings.finish()
+    if SLOW_CHAT_MS and breakdown["total_ms"] > SLOW_CHAT_MS:
+        logging.warning("Slow chat (%.0f ms): %s", breakdown["total_ms"], breakdown)
+    if include:
+        return {**result, "timings": breakdown}
+    return result
+
+
+def timings_requested():
+    return request.args.get("timings") in ("1", "true")
+
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
 # ROUTES
 @app.route("/upload", methods=["POST"])
 def upload_file():
@@ -99,29 +387,59 @@ def list_documents():
         })
     return jsonify(docs)
 
-@app.route("/list_files", methods=["GET"])
-def list_files():
-    try:
-        points, _ = qdrant_client.scroll(
+def backfill_registry():
+    """Register files that are in Qdrant but not in the registry, once.
+
+    Covers collections built before the registry existed. Files an ingest
+    has registered meanwhile keep their row.
+    """
+    if registry.get_flag("backfilled"):
+        return
+
+    files = {}
+    offset = None
+    while True:
+        points, offset = qdrant_client.scroll(
             collection_name=COLLECTION_NAME,
-            with_payload=True,
-            limit=1000
+            with_payload=["filename", "description", "upload_date"],
+            with_vectors=False,
+            limit=1000,
+            offset=offset
         )
-
-        files = {}
         for point in points:
             payload = point.payload or {}
             filename = payload.get("filename")
+            if not filename:
+                continue
+            record = files.setdefault(filename, {
+                "description": payload.get("description", ""),
+                "upload_date": payload.get("upload_date", ""),
+                "chunk_count": 0
+            })
+            record["chunk_count"] += 1
+        if offset is None:
+            break
 
-            if filename and filename not in files:
-                files[filename] = {
-                    "filename": filename,
-                    "description": payload.get("description", ""),
-                    "upload_date": payload.get("upload_date", "")
-                }
+    added = sum(
+        registry.add_missing(filename, size_bytes=0, **record)
+        for filename, record in files.items()
+    )
+    registry.set_flag("backfilled")
+    if added:
+        logging.info("Backfilled document registry with %d files", added)
+
+
+@app.route("/list_files", methods=["GET"])
+def list_files():
+    try:
+        offset = max(request.args.get("offset", 0, type=int), 0)
+        limit = min(max(request.args.get("limit", 100, type=int), 1), 1000)
 
         return jsonify({
-            "files": list(files.values())
+            "files": registry.page(offset, limit),
+            "total": registry.count(),
+            "offset": offset,
+            "limit": limit
         }), 200
 
     except Exception as e:
@@ -131,14 +449,253 @@ def list_files():
         }), 500
 
 
-@app.route("/save_vector", methods=["POST"])
-def save_vector():
-    if "files" not in request.files:
-        return jsonify({"error": "No files provided"}), 400
+# Chunks per embedding/upsert batch and batches buffered between stages
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "256"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "2"))
+
+# Qdrant write batching
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "256"))
+UPSERT_IN_FLIGHT = int(os.getenv("UPSERT_IN_FLIGHT", "3"))
+UPSERT_RETRIES = int(os.getenv("UPSERT_RETRIES", "3"))
+
+# One ingest or delete per filename at a time: both read the manifest and
+# delete what it doesn't list, so overlapping runs orphan each other's points
+_file_locks = {}
+_file_locks_guard = threading.Lock()
 
-    files = request.files.getlist("files")
 
-    # Collect descriptions
+def file_lock(filename):
+    with _file_locks_guard:
+        return _file_locks.setdefault(filename, threading.Lock())
+
+
+def ingest_file(path, filename, description, progress=None):
+    """Extract, chunk, embed and upsert one file.
+
+    Extraction/chunking, embedding and upserting run as separate stages
+    connected by bounded queues, so only a few batches are in memory.
+    Point ids are derived from the filename and chunk hash, so re-ingesting
+    a file only embeds new or changed chunks and deletes the stale ones.
+    Returns counts of total, newly inserted, unchanged and deleted chunks,
+    and the time spent in each stage.
+    """
+    with metrics.in_flight("rag_ingest_in_flight", "Files currently being ingested"):
+        try:
+            with file_lock(filename), swap_lock.ingest():
+                result = _ingest_file(path, filename, description, progress)
+        except Exception:
+            metrics.inc("rag_ingested_files_total", 1, "Ingested files, by outcome",
+                        status="failed")
+            raise
+
+    metrics.inc("rag_ingested_files_total", 1, "Ingested files, by outcome", status="done")
+    for outcome in ("inserted", "unchanged", "deleted"):
+        metrics.inc("rag_ingested_chunks_total", result[outcome],
+                    "Chunks processed by ingestion, by outcome", outcome=outcome)
+    return result
+
+
+def _ingest_file(path, filename, description, progress):
+    progress = progress or (lambda **fields: None)
+    timings = Timings("ingest")
+    hybrid = collection.get()["hybrid"]
+    embedder = embeddings.get()
+    ext = os.path.splitext(filename)[1].lower()
+    upload_date = datetime.utcnow().isoformat()
+    counts = {"chunks": 0, "processed": 0, "unchanged": 0}
+    previous = manifest.point_ids(filename)
+    had_manifest = bool(previous)
+    current = {}
+
+    extractor, structured = get_extractor(ext)
+
+    def checked_sections():
+        has_text = False
+        for section in timings.iter("extract", extractor(path)):
+            text = section[-1]
+            has_text = has_text or bool(text and text.strip())
+            yield section
+        if not has_text:
+            raise ValueError("Extracted text is empty")
+        progress(extracted=1)
+
+    def chunk_batches():
+        chunks = chunk_sections(
+            checked_sections(),
+            SimpleNamespace(split_text=timings.wrap("chunk", text_splitter.get().split_text)),
+            CHUNK_SIZE,
+            header=f"Description: {description}\n\n",
+            structured=structured
+        )
+        for batch in batched(chunks, INGEST_BATCH_SIZE):
+            counts["chunks"] += len(batch)
+            progress(chunks_total=counts["chunks"])
+            yield batch
+
+    def embedded_batches():
+        for batch in prefetch(chunk_batches(), INGEST_QUEUE_SIZE):
+            fresh = []
+            for page, chunk in batch:
+                digest = chunk_hash(chunk)
+                if digest in current:
+                    continue
+                point_id = chunk_point_id(filename, digest)
+                current[digest] = point_id
+                if point_id in previous:
+                    counts["unchanged"] += 1
+                else:
+                    fresh.append((point_id, page, chunk))
+
+            texts = [chunk for _, _, chunk in fresh]
+            with timings.stage("embed"):
+                vectors = embedder.embed_documents(texts)
+                if hybrid:
+                    vectors = [
+                        {"": vector, SPARSE_VECTOR_NAME: sparse_document_vector(text)}
+                        for vector, text in zip(vectors, texts)
+                    ]
+            counts["processed"] += len(batch)
+            progress(chunks_embedded=counts["processed"])
+            yield fresh, vectors
+
+    writer = BatchedWriter(
+        qdrant_client,
+        COLLECTION_NAME,
+        batch_size=UPSERT_BATCH_SIZE,
+        max_in_flight=UPSERT_IN_FLIGHT,
+        max_retries=UPSERT_RETRIES,
+        on_written=lambda count: progress(points_upserted=count)
+    )
+
+    try:
+        for fresh, vectors in prefetch(embedded_batches(), INGEST_QUEUE_SIZE):
+            if chunk_store is not None:
+                # Stored before the points, so no search hit lacks its text
+                chunk_store.put_many({point_id: chunk for point_id, _, chunk in fresh})
+            for (point_id, page, chunk), vector in zip(fresh, vectors):
+                if chunk_store is None:
+                    payload = {
+                        "text": chunk,
+                        "filename": filename,
+                        "description": description,
+                        "upload_date": upload_date,
+                        "embedding_model": embedder.signature
+                    }
+                else:
+                    # Description and date are in the document registry
+                    payload = {"filename": filename, "embedding_model": embedder.signature}
+                if page is not None:
+                    payload["page"] = page
+
+                writer.add(
+                    models.PointStruct(
+                        id=point_id,
+                        vector=vector,
+                        payload=payload
+                    )
+                )
+
+        inserted = writer.close()
+        timings.add("upsert", writer.upsert_seconds)
+        if not current:
+            raise ValueError("Text splitter returned no chunks")
+
+    except Exception:
+        # Don't leave a partial copy of the file behind; the previous
+        # version, if any, is untouched
+        writer.abort()
+        answer_cache.invalidate_file(filename)
+        raise
+
+    cleanup_start = time.perf_counter()
+    size_bytes = os.path.getsize(path)
+    try:
+        keep = set(current.values())
+        stale = previous - keep
+        if had_manifest:
+            if stale:
+                stale = list(stale)
+                for start in range(0, len(stale), UPSERT_BATCH_SIZE):
+                    qdrant_client.delete(
+                        collection_name=COLLECTION_NAME,
+                        points_selector=models.PointIdsList(
+                            points=stale[start:start + UPSERT_BATCH_SIZE]
+                        )
+                    )
+        else:
+            # No manifest yet: drop any earlier copy of the file stored
+            # under random ids
+            qdrant_client.delete(
+                collection_name=COLLECTION_NAME,
+                points_selector=models.FilterSelector(
+                    filter=models.Filter(
+                        must=[models.FieldCondition(
+                            key="filename",
+                            match=models.MatchValue(value=filename)
+                        )],
+                        must_not=[models.HasIdCondition(has_id=list(keep))]
+                    )
+                )
+            )
+
+        if counts["unchanged"] and chunk_store is None:
+            # Kept chunks still carry the old description and date
+            qdrant_client.set_payload(
+                collection_name=COLLECTION_NAME,
+                payload={"description": description, "upload_date": upload_date},
+                points=list(previous & keep)
+            )
+
+        manifest.replace(filename, current)
+        # Before the registry, so a re-index that sees the new upload date
+        # also finds the new source
+        keep_source(path, filename)
+        registry.upsert(
+            filename,
+            description=description,
+            upload_date=upload_date,
+            chunk_count=len(current),
+            size_bytes=size_bytes
+        )
+
+    finally:
+        answer_cache.invalidate_file(filename)
+    timings.add("cleanup", time.perf_counter() - cleanup_start)
+
+    return {
+        "chunks": len(current),
+        "inserted": inserted,
+        "unchanged": counts["unchanged"],
+        "deleted": len(stale),
+        "timings": timings.finish()
+    }
+
+
+def keep_source(path, filename):
+    """Move an ingested file into UPLOAD_FOLDER (when KEEP_SOURCES is on)."""
+    if KEEP_SOURCES:
+        shutil.move(path, os.path.join(UPLOAD_FOLDER, filename))
+
+
+#INGESTION JOBS
+JOBS_FOLDER = os.getenv("JOBS_FOLDER", "jobs")
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+
+# One app process per data folder; concurrency comes from threads
+process_lock = lock_folder(JOBS_FOLDER)
+# Paused while reindex.py moves the collection alias
+swap_lock = SwapLock(JOBS_FOLDER)
+
+job_queue = JobQueue(
+    JobStore(os.path.join(JOBS_FOLDER, "jobs.sqlite3")),
+    ingest_file,
+    folder=JOBS_FOLDER,
+    max_workers=INGEST_WORKERS
+)
+job_queue.resume()
+
+
+def collect_descriptions():
     descriptions = []
     i = 0
     while True:
@@ -147,105 +704,226 @@ def save_vector():
             break
         descriptions.append(desc)
         i += 1
+    return descriptions
+
+
+@app.route("/save_vector", methods=["POST"])
+def save_vector():
+    if "files" not in request.files:
+        return jsonify({"error": "No files provided"}), 400
+
+    files = request.files.getlist("files")
+    descriptions = collect_descriptions()
 
     if len(files) != len(descriptions):
         return jsonify({"error": "Files and descriptions mismatch"}), 400
 
-    extractors = {
-        ".pdf": extract_text_from_pdf,
-        ".docx": extract_text_from_docx,
-        ".txt": extract_text_from_txt,
-        ".csv": extract_text_from_csv,
-        ".json": extract_text_from_json,
-        ".xlsx": extract_text_from_xlsx,
-    }
-
     success = []
     failed = []
+    saved = []
 
     for index, file in enumerate(files):
         filename = secure_filename(file.filename)
         ext = os.path.splitext(filename)[1].lower()
 
-        if ext not in extractors:
+        if ext not in EXTRACTORS:
             failed.append({"filename": filename, "error": "Unsupported file type"})
             continue
 
-        temp_path = os.path.join(TEMP_FOLDER, filename)
+        # Unique per upload: names repeat within and across requests
+        temp_path = os.path.join(TEMP_FOLDER, f"{uuid.uuid4().hex}_{filename}")
         file.save(temp_path)
+        saved.append((temp_path, filename, descriptions[index]))
 
-        try:
-            with open(temp_path, "rb") as f:
-                text = extractors[ext](f)
+    include_timings = timings_requested()
 
-            if not text or not text.strip():
-                raise ValueError("Extracted text is empty")
+    # Files are extracted and ingested concurrently
+    with ThreadPoolExecutor(max_workers=INGEST_WORKERS) as pool:
+        futures = [pool.submit(ingest_file, *args) for args in saved]
 
-            combined_text = f"Description: {descriptions[index]}\n\n{text}"
+        for (temp_path, filename, _), future in zip(saved, futures):
+            try:
+                result = future.result()
+                entry = {
+                    "filename": filename,
+                    "chunks_inserted": result["inserted"],
+                    "chunks_unchanged": result["unchanged"],
+                    "chunks_deleted": result["deleted"]
+                }
+                if include_timings:
+                    entry["timings"] = result["timings"]
+                success.append(entry)
 
-            chunks = text_splitter.split_text(combined_text)
+            except Exception as e:
+                failed.append({
+                    "filename": filename,
+                    "error": str(e)
+                })
 
-            if not chunks:
-                raise ValueError("Text splitter returned no chunks")
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
 
-            points = []
-            for chunk in chunks:
-                vector = embeddings.embed_query(chunk)
+    return jsonify({
+        "success": success,
+        "failed": failed
+    }), 200
 
-                points.append(
-                    models.PointStruct(
-                        id=str(uuid.uuid4()),
-                        vector=vector,
-                        payload={
-                            "text": chunk,
-                            "filename": filename,
-                            "description": descriptions[index],
-                            "upload_date": datetime.utcnow().isoformat()
-                        }
-                    )
-                )
 
-            qdrant_client.upsert(
-                collection_name=COLLECTION_NAME,
-                points=points,
-                wait=True
-            )
+@app.route("/ingest", methods=["POST"])
+def ingest():
+    """Queue files for background ingestion and return the job id right away."""
+    if "files" not in request.files:
+        return jsonify({"error": "No files provided"}), 400
 
-            success.append({
-                "filename": filename,
-                "chunks_inserted": len(points)
-            })
+    files = request.files.getlist("files")
+    descriptions = collect_descriptions()
 
-        except Exception as e:
-            failed.append({
-                "filename": filename,
-                "error": str(e)
-            })
+    if len(files) != len(descriptions):
+        return jsonify({"error": "Files and descriptions mismatch"}), 400
 
-        finally:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
+    unsupported = [
+        secure_filename(file.filename) for file in files
+        if os.path.splitext(secure_filename(file.filename))[1].lower() not in EXTRACTORS
+    ]
+    if unsupported:
+        return jsonify({"error": "Unsupported file type", "files": unsupported}), 400
 
-    return jsonify({
-        "success": success,
-        "failed": failed
-    }), 200
+    job_id = job_queue.new_job_id()
+    queued = []
+    for index, file in enumerate(files):
+        filename = secure_filename(file.filename)
+        path = os.path.join(job_queue.job_folder(job_id), f"{index}_{filename}")
+        file.save(path)
+        queued.append({
+            "filename": filename,
+            "description": descriptions[index],
+            "path": path
+        })
 
+    job_queue.submit(job_id, queued)
 
-@app.route("/chat", methods=["POST"])
-def chat():
-    data = request.get_json()
+    return jsonify({"job_id": job_id}), 202
+
+
+@app.route("/jobs", methods=["GET"])
+def list_jobs():
+    limit = request.args.get("limit", 20, type=int)
+    return jsonify({"jobs": job_queue.store.recent(limit)})
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    job = job_queue.store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+
+#CHUNKED UPLOADS
+# Resumable alternative to /ingest for large files: POST /uploads, then PUT
+# parts at ?offset=..., then POST /uploads/<id>/finalize to queue a job.
+# Kept under JOBS_FOLDER so finalizing moves the file into its job folder
+# with a rename instead of a copy.
+upload_store = UploadStore(
+    os.getenv("CHUNKED_UPLOADS_FOLDER", os.path.join(JOBS_FOLDER, "uploads")),
+    max_part_bytes=int(os.getenv("UPLOAD_MAX_PART_MB", "64")) * 1024 * 1024,
+    expiry_hours=float(os.getenv("UPLOAD_EXPIRY_HOURS", "24"))
+)
+
+
+@app.errorhandler(UploadError)
+def upload_error(e):
+    return jsonify({"error": str(e), **e.details}), e.status
+
+
+@app.route("/uploads", methods=["POST"])
+def create_upload():
+    data = request.get_json(silent=True) or {}
+    filename = secure_filename(data.get("filename") or "")
+    if os.path.splitext(filename)[1].lower() not in EXTRACTORS:
+        return jsonify({"error": "Unsupported file type", "files": [filename]}), 400
+
+    size = data.get("size")
+    if size is not None and not isinstance(size, int):
+        return jsonify({"error": "size must be an integer"}), 400
+
+    upload = upload_store.create(
+        filename, data.get("description", ""), size, data.get("sha256")
+    )
+    return jsonify(upload), 201
+
+
+@app.route("/uploads/<upload_id>", methods=["GET"])
+def get_upload(upload_id):
+    """Upload state; ``offset`` is where the next part must start."""
+    return jsonify(upload_store.get(upload_id))
+
+
+@app.route("/uploads/<upload_id>", methods=["PUT"])
+def append_upload(upload_id):
+    """Append the raw request body at ``?offset=``.
+
+    The body is streamed to disk without form parsing. ``X-Part-SHA256``
+    optionally carries the part's hex digest.
+    """
+    offset = request.args.get("offset", type=int)
+    if offset is None:
+        return jsonify({"error": "offset required"}), 400
+
+    upload = upload_store.append(
+        upload_id, offset, request.stream,
+        length=request.content_length,
+        sha256=request.headers.get("X-Part-SHA256")
+    )
+    return jsonify(upload)
+
+
+@app.route("/uploads/<upload_id>/finalize", methods=["POST"])
+def finalize_upload(upload_id):
+    upload = upload_store.get(upload_id)
+    job_id = job_queue.new_job_id()
+    path = os.path.join(job_queue.job_folder(job_id), f"0_{upload['filename']}")
+    try:
+        upload_store.finalize(upload_id, path)
+    except Exception:
+        shutil.rmtree(job_queue.job_folder(job_id), ignore_errors=True)
+        raise
+
+    job_queue.submit(job_id, [{
+        "filename": upload["filename"],
+        "description": upload["description"],
+        "path": path
+    }])
+    return jsonify({"job_id": job_id}), 202
+
+
+@app.route("/uploads/<upload_id>", methods=["DELETE"])
+def abort_upload(upload_id):
+    upload_store.abort(upload_id)
+    return jsonify({"message": "Upload aborted"})
+
+
+def parse_chat_request():
+    return parse_chat_payload(request.get_json(silent=True) or {})
+
+
+def parse_chat_payload(data):
     query = data.get("query_text", "").strip()
     target_files = data.get("target_files", [])
 
-    if not query:
-        return jsonify({"error": "Query required"}), 400
-
     if isinstance(target_files, str):
         target_files = [target_files]
 
-    query_vector = embeddings.embed_query(query)
+    return query, target_files
+
+
+def search_request(query, query_vector, target_files, settings):
+    """Keyword arguments for the first-stage ``query_points`` call.
 
+    With hybrid search the dense and sparse result lists are merged with
+    reciprocal-rank fusion.
+    """
     q_filter = None
     if target_files:
         q_filter = Filter(
@@ -255,47 +933,242 @@ def chat():
             )]
         )
 
-    results = qdrant_client.search(
-        collection_name=COLLECTION_NAME,
-        query_vector=query_vector,
-        query_filter=q_filter,
-        limit=20
-    )
+    if not settings["hybrid"]:
+        return {
+            "collection_name": COLLECTION_NAME,
+            "query": query_vector,
+            "query_filter": q_filter,
+            "search_params": search_params(),
+            "limit": settings["rerank_candidates"],
+            "with_payload": SEARCH_PAYLOAD
+        }
+
+    return {
+        "collection_name": COLLECTION_NAME,
+        "prefetch": [
+            models.Prefetch(
+                query=query_vector,
+                filter=q_filter,
+                params=search_params(),
+                limit=HYBRID_PREFETCH
+            ),
+            models.Prefetch(
+                query=sparse_query_vector(query),
+                using=SPARSE_VECTOR_NAME,
+                filter=q_filter,
+                limit=HYBRID_PREFETCH
+            )
+        ],
+        "query": models.FusionQuery(fusion=models.Fusion.RRF),
+        "limit": settings["rerank_candidates"],
+        "with_payload": SEARCH_PAYLOAD
+    }
 
-    if not results:
-        return jsonify({"error": "No results found"}), 404
 
-    rerank_inputs = [(query, r.payload["text"]) for r in results]
-    scores = reranker.predict(rerank_inputs)
+def rerank_job(query, results, settings):
+    # Adaptive thresholds are calibrated on cosine scores, not RRF scores
+    adaptive = RERANK_ADAPTIVE and not settings["hybrid"]
+    return (query, results, RERANK_KEEP, adaptive)
 
-    for i, r in enumerate(results):
-        r.payload["rerank_score"] = float(scores[i])
 
-    top = sorted(results, key=lambda x: x.payload["rerank_score"], reverse=True)[:10]
+def rerank_hits(query, results, settings):
+    return rerank_batcher.run(rerank_job(query, results, settings))
 
-    context = "\n\n".join(r.payload["text"] for r in top)
 
-    client = openai.OpenAI(api_key=OPENAI_API_KEY)
+def hydrate_texts(points):
+    """Fill ``payload["text"]`` from the chunk store; hits without text are dropped."""
+    if chunk_store is None:
+        return points
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": "Answer using only provided context."},
-            {"role": "user", "content": f"Context:\n{context}\n\nQuestion:\n{query}"}
-        ],
-        temperature=0.3,
-        max_tokens=800
-    )
+    texts = chunk_store.get_many(point.id for point in points)
+    missing = [point.id for point in points if str(point.id) not in texts]
+    if missing:
+        # Points written before the chunk store was enabled carry their text
+        for point in qdrant_client.retrieve(
+            collection_name=COLLECTION_NAME, ids=missing, with_payload=["text"]
+        ):
+            if (point.payload or {}).get("text"):
+                texts[str(point.id)] = point.payload["text"]
 
-    return jsonify({
+    hydrated = []
+    for point in points:
+        text = texts.get(str(point.id))
+        if text is None:
+            logging.warning("No stored text for point %s; skipping it", point.id)
+            continue
+        point.payload["text"] = text
+        hydrated.append(point)
+    return hydrated
+
+
+def retrieve_context(query, query_vector, target_files, timings):
+    """First-stage search plus CrossEncoder rerank; returns the top hits."""
+    settings = collection.get()
+    with timings.stage("search"):
+        results = qdrant_client.query_points(
+            **search_request(query, query_vector, target_files, settings)
+        ).points
+    if chunk_store is not None:
+        with timings.stage("hydrate"):
+            results = hydrate_texts(results)
+    with timings.stage("rerank"):
+        return rerank_hits(query, results, settings)
+
+
+def pack_context(top, timings):
+    """Token-budgeted context and the hits it uses; see context_builder."""
+    with timings.stage("context"):
+        return build_context(top)
+
+
+def build_messages(query, context):
+    return [
+        {"role": "system", "content": "Answer using only provided context."},
+        {"role": "user", "content": f"Context:\n{context}\n\nQuestion:\n{query}"}
+    ]
+
+
+def format_sources(top):
+    return [
+        {
+            "filename": r.payload["filename"],
+            "score": r.payload["rerank_score"]
+        } for r in top
+    ]
+
+
+@app.route("/chat", methods=["POST"])
+def chat():
+    query, target_files = parse_chat_request()
+
+    if not query:
+        return jsonify({"error": "Query required"}), 400
+
+    include_timings = timings_requested()
+    timings = Timings("chat")
+
+    with timings.stage("cache"):
+        cached = answer_cache.get(query, target_files)
+    if cached is not None:
+        return jsonify(finish_timings(timings, {**cached, "cached": True}, include_timings))
+
+    generation = answer_cache.generation()
+    with timings.stage("embed"):
+        query_vector = query_embedder.run(query)
+
+    with timings.stage("cache"):
+        cached = answer_cache.get_semantic(query_vector, target_files)
+    if cached is not None:
+        return jsonify(finish_timings(timings, {**cached, "cached": True}, include_timings))
+
+    top = retrieve_context(query, query_vector, target_files, timings)
+    if not top:
+        finish_timings(timings, {}, False)
+        return jsonify({"error": "No results found"}), 404
+
+    context, top = pack_context(top, timings)
+    with timings.stage("generate"):
+        response = llm.get().chat.completions.create(
+            messages=build_messages(query, context),
+            **CHAT_COMPLETION
+        )
+    record_token_usage(response.usage)
+
+    result = {
         "answer": response.choices[0].message.content.strip(),
-        "sources": [
-            {
-                "filename": r.payload["filename"],
-                "score": r.payload["rerank_score"]
-            } for r in top
-        ]
-    })
+        "sources": format_sources(top)
+    }
+    answer_cache.put(query, target_files, query_vector, result, generation)
+
+    return jsonify(finish_timings(timings, result, include_timings))
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.route("/chat_stream", methods=["POST"])
+def chat_stream():
+    """Server-sent-events variant of /chat.
+
+    Emits a ``sources`` event, then one ``token`` event per generated delta,
+    then ``done`` (or ``error``).
+    """
+    query, target_files = parse_chat_request()
+
+    if not query:
+        return jsonify({"error": "Query required"}), 400
+
+    include_timings = timings_requested()
+    timings = Timings("chat_stream")
+
+    def replay(cached):
+        yield sse_event("sources", cached["sources"])
+        yield sse_event("token", {"text": cached["answer"]})
+        yield sse_event("done", finish_timings(timings, {"cached": True}, include_timings))
+
+    with timings.stage("cache"):
+        cached = answer_cache.get(query, target_files)
+    if cached is not None:
+        return Response(replay(cached), mimetype="text/event-stream")
+
+    generation = answer_cache.generation()
+    with timings.stage("embed"):
+        query_vector = query_embedder.run(query)
+
+    with timings.stage("cache"):
+        cached = answer_cache.get_semantic(query_vector, target_files)
+    if cached is not None:
+        return Response(replay(cached), mimetype="text/event-stream")
+
+    top = retrieve_context(query, query_vector, target_files, timings)
+    if not top:
+        finish_timings(timings, {}, False)
+        return jsonify({"error": "No results found"}), 404
+
+    context, top = pack_context(top, timings)
+    sources = format_sources(top)
+    messages = build_messages(query, context)
+
+    def generate():
+        yield sse_event("sources", sources)
+
+        parts = []
+        try:
+            generate_start = time.perf_counter()
+            stream = llm.get().chat.completions.create(
+                messages=messages,
+                stream=True,
+                stream_options={"include_usage": True},
+                **CHAT_COMPLETION
+            )
+            for event in stream:
+                # The last chunk carries usage and no choices
+                if getattr(event, "usage", None):
+                    record_token_usage(event.usage)
+                if not event.choices:
+                    continue
+                delta = event.choices[0].delta.content
+                if delta:
+                    if not parts:
+                        timings.add("first_token", time.perf_counter() - generate_start)
+                    parts.append(delta)
+                    yield sse_event("token", {"text": delta})
+            timings.add("generate", time.perf_counter() - generate_start)
+        except Exception as e:
+            finish_timings(timings, {}, False)
+            yield sse_event("error", {"error": str(e)})
+            return
+
+        result = {"answer": "".join(parts).strip(), "sources": sources}
+        answer_cache.put(query, target_files, query_vector, result, generation)
+        yield sse_event("done", finish_timings(timings, {"cached": False}, include_timings))
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 @app.route("/delete_file", methods=["POST"])
@@ -304,21 +1177,70 @@ def delete_file():
     if not filename:
         return jsonify({"error": "Filename required"}), 400
 
-    qdrant_client.delete(
-        collection_name=COLLECTION_NAME,
-        points_selector=models.FilterSelector(
-            filter=models.Filter(
-                must=[models.FieldCondition(
-                    key="filename",
-                    match=models.MatchValue(value=filename)
-                )]
+    # Waits for a running ingest of the file, which would otherwise re-add it
+    with file_lock(filename), swap_lock.ingest():
+        qdrant_client.delete(
+            collection_name=COLLECTION_NAME,
+            points_selector=models.FilterSelector(
+                filter=models.Filter(
+                    must=[models.FieldCondition(
+                        key="filename",
+                        match=models.MatchValue(value=filename)
+                    )]
+                )
             )
         )
-    )
+        manifest.delete(filename)
+        registry.delete(filename)
+        answer_cache.invalidate_file(filename)
+
+    source = os.path.join(UPLOAD_FOLDER, secure_filename(filename))
+    if os.path.exists(source):
+        os.remove(source)
 
     return jsonify({"message": f"{filename} deleted"})
 
 
+#HEALTH
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    """Liveness: the process is up and serving requests."""
+    return jsonify({"status": "ok"})
+
+
+@app.route("/readyz", methods=["GET"])
+def readyz():
+    """Readiness: 200 once every component is warm, 503 until then."""
+    ready = all(component.ready for component in COMPONENTS)
+    return jsonify({
+        "ready": ready,
+        "components": {component.name: component.status() for component in COMPONENTS}
+    }), 200 if ready else 503
+
+
+#WARMUP
+WARMUP = os.getenv("WARMUP", "1") == "1"
+
+
+def run_backfill():
+    try:
+        collection.get()
+        backfill_registry()
+    except Exception:
+        logging.exception("Document registry backfill failed")
+
+
+def run_warmup():
+    warm_up(COMPONENTS)
+
+
+# Independent of WARMUP and of the slower model loads
+threading.Thread(target=run_backfill, name="registry-backfill", daemon=True).start()
+
+if WARMUP:
+    threading.Thread(target=run_warmup, name="warmup", daemon=True).start()
+
+
 if __name__ == "__main__":
     app.run(debug=True, use_reloader=False)
 
@@ -0,0 +1,340 @@
+# asgi.py
+"""ASGI entry point for production serving.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+Run a single worker: job resumption, upload and ingest locks and answer
+cache invalidation live in the process, and the app refuses to start when
+another process holds its JOBS_FOLDER.
+
+/chat and /chat_stream are served natively async: the query embedding,
+Qdrant search, rerank and LLM call are awaited on clients shared by every
+request, each dependency behind its own concurrency limit and timeout.
+All other routes, including ingestion (which already runs on the job
+queue's threads), are the Flask app served from a thread pool.
+"""
+import asyncio
+import contextlib
+import json
+import os
+import time
+
+import httpx
+import openai
+from a2wsgi import WSGIMiddleware
+from qdrant_client import AsyncQdrantClient
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+import app as backend
+from metrics import Timings, metrics
+
+# Threads serving the mounted Flask routes
+WSGI_THREADS = int(os.getenv("WSGI_THREADS", "16"))
+
+
+class DependencyTimeout(Exception):
+    pass
+
+
+class Dependency:
+    """Concurrency limit and timeout for one downstream service."""
+
+    def __init__(self, name: str, concurrency: int, timeout: float):
+        self.name = name
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+    async def call(self, func, *args, **kwargs):
+        """Await ``func(*args, **kwargs)``; waiting for a slot counts towards the timeout."""
+        async def limited():
+            async with self.semaphore:
+                return await func(*args, **kwargs)
+
+        return await self.wait(limited())
+
+    async def wait(self, awaitable):
+        """Await with this dependency's timeout but without its concurrency limit."""
+        try:
+            return await asyncio.wait_for(awaitable, self.timeout)
+        except asyncio.TimeoutError:
+            raise DependencyTimeout(f"{self.name} timed out after {self.timeout}s")
+
+
+def dependency(name: str, concurrency: str, timeout: str) -> Dependency:
+    prefix = name.upper()
+    return Dependency(
+        name,
+        int(os.getenv(f"ASYNC_{prefix}_CONCURRENCY", concurrency)),
+        float(os.getenv(f"ASYNC_{prefix}_TIMEOUT", timeout))
+    )
+
+
+EMBED = dependency("embed", "32", "30")
+QDRANT = dependency("qdrant", "32", "30")
+# CPU-bound, so only a couple of forward passes at a time
+RERANK = dependency("rerank", "2", "30")
+LLM = dependency("llm", "64", "120")
+
+
+async def component(lazy):
+    """Value of a lazy component, building it off the event loop if needed."""
+    if lazy.ready:
+        return lazy.get()
+    return await asyncio.to_thread(lazy.get)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    if backend.QDRANT_PATH:
+        # Embedded storage is locked by (or, in memory, private to) the
+        # backend's client, so searches go through that one
+        app.state.qdrant = None
+    else:
+        app.state.qdrant = AsyncQdrantClient(
+            url=backend.QDRANT_URL,
+            api_key=backend.QDRANT_API_KEY,
+            timeout=backend.QDRANT_TIMEOUT,
+            check_compatibility=False
+        )
+    # One keep-alive pool for every chat handled by this worker
+    app.state.llm = openai.AsyncOpenAI(
+        api_key=backend.OPENAI_API_KEY,
+        timeout=backend.LLM_TIMEOUT,
+        max_retries=backend.LLM_MAX_RETRIES,
+        http_client=openai.DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=LLM.concurrency,
+                max_keepalive_connections=LLM.concurrency
+            )
+        )
+    )
+    yield
+    if app.state.qdrant is not None:
+        await app.state.qdrant.close()
+    await app.state.llm.close()
+
+
+async def read_chat_request(request):
+    try:
+        data = await request.json()
+    except json.JSONDecodeError:
+        data = {}
+    return backend.parse_chat_payload(data if isinstance(data, dict) else {})
+
+
+async def embed_query(query):
+    embedder = await component(backend.embeddings)
+    if backend.query_embedder.enabled:
+        # Joins concurrent queries in one embedding call
+        return await EMBED.call(backend.query_embedder.arun, query)
+    return await EMBED.call(embedder.aembed_query, query)
+
+
+async def rerank(query, results, settings):
+    job = backend.rerank_job(query, results, settings)
+    if backend.rerank_batcher.enabled:
+        # The batcher already runs one forward pass at a time; limiting
+        # callers here would only shrink its batches
+        return await RERANK.wait(backend.rerank_batcher.arun(job))
+    return await RERANK.call(backend.rerank_batcher.arun, job)
+
+
+async def query_points(request, **kwargs):
+    if request.app.state.qdrant is None:
+        return await asyncio.to_thread(backend.qdrant_client.query_points, **kwargs)
+    return await request.app.state.qdrant.query_points(**kwargs)
+
+
+async def retrieve_context(request, query, query_vector, target_files, timings):
+    """Async counterpart of ``app.retrieve_context``."""
+    settings = await component(backend.collection)
+    with timings.stage("search"):
+        response = await QDRANT.call(
+            query_points, request,
+            **backend.search_request(query, query_vector, target_files, settings)
+        )
+    results = response.points
+    if backend.chunk_store is not None:
+        with timings.stage("hydrate"):
+            results = await asyncio.to_thread(backend.hydrate_texts, results)
+    with timings.stage("rerank"):
+        return await rerank(query, results, settings)
+
+
+def timings_requested(request):
+    return request.query_params.get("timings") in ("1", "true")
+
+
+async def instrumented(endpoint, handler, request):
+    """Same request metrics as the Flask hooks; a stream counts until its response starts."""
+    start = time.perf_counter()
+    # What the exception handlers turn an escaping error into
+    status = 500
+    try:
+        with metrics.in_flight("rag_requests_in_flight", endpoint=endpoint):
+            response = await handler(request)
+        status = response.status_code
+        return response
+    except DependencyTimeout:
+        status = 504
+        raise
+    finally:
+        metrics.inc("rag_requests_total", 1, endpoint=endpoint, status=status)
+        metrics.observe("rag_request_seconds", time.perf_counter() - start, endpoint=endpoint)
+
+
+async def chat(request):
+    return await instrumented("chat", answer, request)
+
+
+async def chat_stream(request):
+    return await instrumented("chat_stream", stream_answer, request)
+
+
+async def answer(request):
+    query, target_files = await read_chat_request(request)
+
+    if not query:
+        return JSONResponse({"error": "Query required"}, status_code=400)
+
+    include_timings = timings_requested(request)
+    timings = Timings("chat")
+    finish_timings = backend.finish_timings
+
+    cache = backend.answer_cache
+    with timings.stage("cache"):
+        cached = cache.get(query, target_files)
+    if cached is not None:
+        return JSONResponse(finish_timings(timings, {**cached, "cached": True}, include_timings))
+
+    generation = cache.generation()
+    with timings.stage("embed"):
+        query_vector = await embed_query(query)
+
+    with timings.stage("cache"):
+        cached = cache.get_semantic(query_vector, target_files)
+    if cached is not None:
+        return JSONResponse(finish_timings(timings, {**cached, "cached": True}, include_timings))
+
+    top = await retrieve_context(request, query, query_vector, target_files, timings)
+    if not top:
+        finish_timings(timings, {}, False)
+        return JSONResponse({"error": "No results found"}, status_code=404)
+
+    context, top = backend.pack_context(top, timings)
+    with timings.stage("generate"):
+        response = await LLM.call(
+            request.app.state.llm.chat.completions.create,
+            messages=backend.build_messages(query, context),
+            **backend.CHAT_COMPLETION
+        )
+    backend.record_token_usage(response.usage)
+
+    result = {
+        "answer": response.choices[0].message.content.strip(),
+        "sources": backend.format_sources(top)
+    }
+    cache.put(query, target_files, query_vector, result, generation)
+
+    return JSONResponse(finish_timings(timings, result, include_timings))
+
+
+async def stream_answer(request):
+    """Server-sent-events variant of /chat, same events as the Flask route."""
+    query, target_files = await read_chat_request(request)
+
+    if not query:
+        return JSONResponse({"error": "Query required"}, status_code=400)
+
+    include_timings = timings_requested(request)
+    timings = Timings("chat_stream")
+    finish_timings = backend.finish_timings
+    sse_event = backend.sse_event
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+    async def replay(cached):
+        yield sse_event("sources", cached["sources"])
+        yield sse_event("token", {"text": cached["answer"]})
+        yield sse_event("done", finish_timings(timings, {"cached": True}, include_timings))
+
+    cache = backend.answer_cache
+    with timings.stage("cache"):
+        cached = cache.get(query, target_files)
+    if cached is not None:
+        return StreamingResponse(replay(cached), media_type="text/event-stream")
+
+    generation = cache.generation()
+    with timings.stage("embed"):
+        query_vector = await embed_query(query)
+
+    with timings.stage("cache"):
+        cached = cache.get_semantic(query_vector, target_files)
+    if cached is not None:
+        return StreamingResponse(replay(cached), media_type="text/event-stream")
+
+    top = await retrieve_context(request, query, query_vector, target_files, timings)
+    if not top:
+        finish_timings(timings, {}, False)
+        return JSONResponse({"error": "No results found"}, status_code=404)
+
+    context, top = backend.pack_context(top, timings)
+    sources = backend.format_sources(top)
+    messages = backend.build_messages(query, context)
+    client = request.app.state.llm
+
+    async def generate():
+        yield sse_event("sources", sources)
+
+        parts = []
+        try:
+            # The slot is held for the whole stream; the client timeout
+            # bounds each read
+            async with LLM.semaphore:
+                generate_start = time.perf_counter()
+                stream = await client.chat.completions.create(
+                    messages=messages,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                    **backend.CHAT_COMPLETION
+                )
+                async for event in stream:
+                    # The last chunk carries usage and no choices
+                    if getattr(event, "usage", None):
+                        backend.record_token_usage(event.usage)
+                    if not event.choices:
+                        continue
+                    delta = event.choices[0].delta.content
+                    if delta:
+                        if not parts:
+                            timings.add("first_token", time.perf_counter() - generate_start)
+                        parts.append(delta)
+                        yield sse_event("token", {"text": delta})
+                timings.add("generate", time.perf_counter() - generate_start)
+        except Exception as e:
+            finish_timings(timings, {}, False)
+            yield sse_event("error", {"error": str(e)})
+            return
+
+        result = {"answer": "".join(parts).strip(), "sources": sources}
+        cache.put(query, target_files, query_vector, result, generation)
+        yield sse_event("done", finish_timings(timings, {"cached": False}, include_timings))
+
+    return StreamingResponse(generate(), media_type="text/event-stream", headers=headers)
+
+
+async def dependency_timeout(request, exc):
+    return JSONResponse({"error": str(exc)}, status_code=504)
+
+
+app = Starlette(
+    routes=[
+        Route("/chat", chat, methods=["POST"]),
+        Route("/chat_stream", chat_stream, methods=["POST"]),
+        Mount("/", app=WSGIMiddleware(backend.app, workers=WSGI_THREADS))
+    ],
+    exception_handlers={DependencyTimeout: dependency_timeout},
+    lifespan=lifespan
+)
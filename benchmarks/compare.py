@@ -0,0 +1,65 @@
+# benchmarks/compare.py
+"""Print the change in headline metrics between two benchmark reports.
+
+    python -m benchmarks.compare before.json after.json
+"""
+import argparse
+import json
+
+# (path, True when higher is better)
+METRICS = [
+    ("ingest.files_per_s", True),
+    ("ingest.chunks_per_s", True),
+    ("ingest.mb_per_s", True),
+    ("chat.queries_per_s", True),
+    ("chat.latency.p50_ms", False),
+    ("chat.latency.p95_ms", False),
+    ("chat.latency.p99_ms", False),
+    ("import_s", False),
+    ("warmup_s", False),
+    ("peak_rss_mb", False),
+]
+
+
+def lookup(report: dict, path: str):
+    value = report
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def stage_metrics(report: dict) -> list[str]:
+    paths = []
+    for section in ("ingest", "chat"):
+        for stage in sorted(lookup(report, f"{section}.stages") or {}):
+            paths.append(f"{section}.stages.{stage}.total_s")
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("before")
+    parser.add_argument("after")
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    metrics = METRICS + [(path, False) for path in stage_metrics(after)]
+    print(f"{'metric':<40} {'before':>12} {'after':>12} {'change':>9}")
+    for path, higher_is_better in metrics:
+        old, new = lookup(before, path), lookup(after, path)
+        if old is None or new is None:
+            continue
+        change = (new - old) / old * 100 if old else 0.0
+        better = change > 0 if higher_is_better else change < 0
+        marker = "" if abs(change) < 5 else (" better" if better else " WORSE")
+        print(f"{path:<40} {old:>12.3f} {new:>12.3f} {change:>+8.1f}%{marker}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+# benchmarks/corpus.py
+"""Synthetic, seeded corpora in every format the backend ingests."""
+import csv
+import json
+import os
+import random
+
+FORMATS = ("pdf", "docx", "txt", "csv", "json", "xlsx")
+
+SYLLABLES = [
+    "ka", "lo", "mer", "tin", "sa", "vor", "el", "qu", "ri", "dan",
+    "po", "zu", "fen", "ax", "bel", "cor", "di", "gra", "hol", "ny"
+]
+CATEGORIES = ["invoice", "report", "contract", "manual", "memo", "policy"]
+# Text per PDF page, in lines of at most PDF_LINE_CHARS characters
+PDF_LINES_PER_PAGE = 60
+PDF_LINE_CHARS = 90
+
+
+class TextGenerator:
+    def __init__(self, seed: int = 0, vocabulary: int = 2000):
+        self.rng = random.Random(seed)
+        words = set()
+        while len(words) < vocabulary:
+            words.add("".join(self.rng.choices(SYLLABLES, k=self.rng.randint(1, 4))))
+        self.words = sorted(words)
+
+    def identifier(self) -> str:
+        return f"{self.rng.choice('ABCDEFGH')}-{self.rng.randint(1000, 9999)}"
+
+    def sentence(self) -> str:
+        words = self.rng.choices(self.words, k=self.rng.randint(8, 20))
+        if self.rng.random() < 0.2:
+            words.insert(self.rng.randrange(len(words)), self.identifier())
+        return " ".join(words).capitalize() + "."
+
+    def paragraph(self) -> str:
+        return " ".join(self.sentence() for _ in range(self.rng.randint(3, 7)))
+
+    def record(self, index: int) -> dict:
+        return {
+            "id": index,
+            "reference": self.identifier(),
+            "category": self.rng.choice(CATEGORIES),
+            "description": self.sentence(),
+            "amount": round(self.rng.uniform(1, 10000), 2)
+        }
+
+
+def _pdf_escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _wrap(text: str, width: int) -> list[str]:
+    lines, line = [], ""
+    for word in text.split():
+        if line and len(line) + 1 + len(word) > width:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    if line:
+        lines.append(line)
+    return lines
+
+
+def write_pdf(path: str, paragraphs: list[str]):
+    """Minimal uncompressed PDF with Helvetica text, no external dependencies."""
+    lines = []
+    for paragraph in paragraphs:
+        lines.extend(_wrap(paragraph, PDF_LINE_CHARS))
+        lines.append("")
+    pages = [
+        lines[start:start + PDF_LINES_PER_PAGE]
+        for start in range(0, len(lines), PDF_LINES_PER_PAGE)
+    ] or [[""]]
+
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    kids = []
+    next_id = 4
+    for page_lines in pages:
+        page_id, content_id = next_id, next_id + 1
+        next_id += 2
+        kids.append(page_id)
+        stream = "BT /F1 10 Tf 12 TL 50 770 Td\n" + "\n".join(
+            f"({_pdf_escape(line)}) Tj T*" for line in page_lines
+        ) + "\nET"
+        data = stream.encode("latin-1")
+        objects[content_id] = (
+            b"<< /Length %d >>\nstream\n" % len(data) + data + b"\nendstream"
+        )
+        objects[page_id] = (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>"
+        ).encode("latin-1")
+    objects[2] = (
+        f"<< /Type /Pages /Kids [{' '.join(f'{k} 0 R' for k in kids)}] "
+        f"/Count {len(kids)} >>"
+    ).encode("latin-1")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for object_id in sorted(objects):
+        offsets[object_id] = len(out)
+        out += b"%d 0 obj\n" % object_id + objects[object_id] + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for object_id in sorted(objects):
+        out += b"%010d 00000 n \n" % offsets[object_id]
+    out += (
+        b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+        % (len(objects) + 1, xref)
+    )
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def write_docx(path: str, paragraphs: list[str]):
+    import docx
+
+    document = docx.Document()
+    for paragraph in paragraphs:
+        document.add_paragraph(paragraph)
+    document.save(path)
+
+
+def write_txt(path: str, paragraphs: list[str]):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n\n".join(paragraphs) + "\n")
+
+
+def write_csv(path: str, records: list[dict]):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(records[0]))
+        writer.writeheader()
+        writer.writerows(records)
+
+
+def write_json(path: str, records: list[dict]):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(records, f, indent=2)
+
+
+def write_xlsx(path: str, records: list[dict]):
+    import openpyxl
+
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("records")
+    sheet.append(list(records[0]))
+    for record in records:
+        sheet.append(list(record.values()))
+    workbook.save(path)
+
+
+def make_corpus(folder: str, docs_per_format: int = 2, paragraphs: int = 40,
+                formats=FORMATS, seed: int = 0) -> dict:
+    """Write ``docs_per_format`` files per format into ``folder``.
+
+    Tabular formats get five records per paragraph. Returns the file paths
+    and sentences that queries can be drawn from.
+    """
+    os.makedirs(folder, exist_ok=True)
+    generator = TextGenerator(seed)
+    files = []
+    sentences = []
+
+    for fmt in formats:
+        for n in range(docs_per_format):
+            path = os.path.join(folder, f"doc_{fmt}_{n}.{fmt}")
+            if fmt in ("csv", "json", "xlsx"):
+                records = [generator.record(i) for i in range(paragraphs * 5)]
+                sentences.extend(r["description"] for r in records)
+                {"csv": write_csv, "json": write_json, "xlsx": write_xlsx}[fmt](path, records)
+            else:
+                texts = [generator.paragraph() for _ in range(paragraphs)]
+                sentences.extend(s + "." for t in texts for s in t.split(". ") if s)
+                {"pdf": write_pdf, "docx": write_docx, "txt": write_txt}[fmt](path, texts)
+            files.append(path)
+
+    return {"files": files, "sentences": sentences}
+
+
+def make_queries(sentences: list[str], count: int, seed: int = 0) -> list[str]:
+    """Distinct queries built from corpus sentences, so each has a real answer."""
+    rng = random.Random(seed)
+    queries = []
+    for index in range(count):
+        words = rng.choice(sentences).rstrip(".").split()
+        start = rng.randrange(max(len(words) - 6, 1))
+        # The suffix keeps queries unique, so the exact-match answer cache
+        # never short-circuits a request
+        queries.append(f"What about {' '.join(words[start:start + 6])}? #{index}")
+    return queries
@@ -0,0 +1,177 @@
+# benchmarks/fake_openai.py
+"""Deterministic local stand-in for the OpenAI embeddings and chat APIs.
+
+Embeddings are hashed bags of words, so texts sharing words are similar and
+sampled queries retrieve the chunks they came from. Chat completions echo a
+fixed number of words from the prompt, streamed or not. Optional latencies
+imitate the real API's round trips.
+"""
+from array import array
+import base64
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import math
+import re
+import threading
+import time
+import zlib
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def fake_embedding(text: str, dim: int) -> list[float]:
+    vector = [0.0] * dim
+    for word in WORD_RE.findall(text.lower()):
+        h = zlib.crc32(word.encode("utf-8"))
+        vector[h % dim] += 1.0 if h & 0x80000000 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def _as_texts(inputs) -> list[str]:
+    # langchain sends token ids when it checks context length
+    if isinstance(inputs, str):
+        return [inputs]
+    if inputs and isinstance(inputs[0], int):
+        return [" ".join(map(str, inputs))]
+    return [item if isinstance(item, str) else " ".join(map(str, item)) for item in inputs]
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, dim: int = 1536, embed_latency_ms: float = 0,
+                 llm_latency_ms: float = 0, token_latency_ms: float = 0,
+                 answer_tokens: int = 50):
+        super().__init__(("127.0.0.1", port), FakeOpenAIHandler)
+        self.dim = dim
+        self.embed_latency = embed_latency_ms / 1000
+        self.llm_latency = llm_latency_ms / 1000
+        self.token_latency = token_latency_ms / 1000
+        self.answer_tokens = answer_tokens
+        self.requests = {"embeddings": 0, "chat": 0}
+        self.embedded_inputs = 0
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def count(self, kind: str, inputs: int = 0):
+        with self._lock:
+            self.requests[kind] += 1
+            self.embedded_inputs += inputs
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="fake-openai", daemon=True).start()
+        return self
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, body: dict, status: int = 200):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+
+        if self.path.endswith("/embeddings"):
+            self._embeddings(body)
+        elif self.path.endswith("/chat/completions"):
+            self._chat(body)
+        else:
+            self._send_json({"error": {"message": f"Unknown path {self.path}"}}, 404)
+
+    def _embeddings(self, body):
+        server = self.server
+        texts = _as_texts(body["input"])
+        server.count("embeddings", len(texts))
+        time.sleep(server.embed_latency)
+
+        dim = body.get("dimensions") or server.dim
+        data = []
+        for index, text in enumerate(texts):
+            vector = fake_embedding(text, dim)
+            if body.get("encoding_format") == "base64":
+                vector = base64.b64encode(array("f", vector).tobytes()).decode("ascii")
+            data.append({"object": "embedding", "index": index, "embedding": vector})
+
+        tokens = sum(len(text.split()) for text in texts)
+        self._send_json({
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "fake"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+        })
+
+    def _chat(self, body):
+        server = self.server
+        server.count("chat")
+        time.sleep(server.llm_latency)
+
+        prompt = " ".join(str(m.get("content", "")) for m in body.get("messages", []))
+        words = WORD_RE.findall(prompt.lower())[-server.answer_tokens:] or ["ok"]
+        prompt_tokens = len(prompt.split())
+        base = {
+            "id": "chatcmpl-fake",
+            "created": int(time.time()),
+            "model": body.get("model", "fake")
+        }
+
+        if not body.get("stream"):
+            self._send_json({
+                **base,
+                "object": "chat.completion",
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": " ".join(words)},
+                    "finish_reason": "stop"
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": len(words),
+                    "total_tokens": prompt_tokens + len(words)
+                }
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for index, word in enumerate(words):
+            time.sleep(server.token_latency)
+            chunk = {
+                **base,
+                "object": "chat.completion.chunk",
+                "choices": [{
+                    "index": 0,
+                    "delta": {"content": word if index == 0 else " " + word},
+                    "finish_reason": None
+                }]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            usage = {
+                **base,
+                "object": "chat.completion.chunk",
+                "choices": [],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": len(words),
+                    "total_tokens": prompt_tokens + len(words)
+                }
+            }
+            self.wfile.write(f"data: {json.dumps(usage)}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
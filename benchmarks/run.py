@@ -0,0 +1,320 @@
+# benchmarks/run.py
+"""Offline benchmark of ingestion (/save_vector) and chat (/chat).
+
+OpenAI is replaced by the local fake in ``fake_openai.py`` and Qdrant runs
+embedded (in memory by default), so no credentials or network are needed
+once the reranker model is in the Hugging Face cache.
+
+    python -m benchmarks.run --docs 2 --paragraphs 40 --queries 200 \\
+        --concurrency 8 --output results.json
+    python -m benchmarks.compare before.json after.json
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import json
+import math
+import os
+import platform
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.corpus import FORMATS, make_corpus, make_queries
+from benchmarks.fake_openai import FakeOpenAIServer
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile; 0.0 for no values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def summarize(seconds: list[float]) -> dict:
+    return {
+        "count": len(seconds),
+        "total_s": round(sum(seconds), 4),
+        "mean_ms": round(1000 * sum(seconds) / len(seconds), 3) if seconds else 0.0,
+        "p50_ms": round(1000 * percentile(seconds, 50), 3),
+        "p95_ms": round(1000 * percentile(seconds, 95), 3),
+        "p99_ms": round(1000 * percentile(seconds, 99), 3),
+    }
+
+
+class StageTimer:
+    """Collects call durations per pipeline stage from any thread."""
+
+    def __init__(self):
+        self.durations = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            self.durations.setdefault(stage, []).append(seconds)
+
+    def wrap(self, stage: str, func):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return timed
+
+    def wrap_iter(self, stage: str, func):
+        """Time each step of the iterator ``func`` returns."""
+        def timed(*args, **kwargs):
+            iterator = iter(func(*args, **kwargs))
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    self.record(stage, time.perf_counter() - start)
+                    return
+                self.record(stage, time.perf_counter() - start)
+                yield item
+        return timed
+
+    def reset(self):
+        with self._lock:
+            self.durations = {}
+
+    def report(self) -> dict:
+        with self._lock:
+            return {stage: summarize(values) for stage, values in sorted(self.durations.items())}
+
+
+def configure_environment(args, server: FakeOpenAIServer, workdir: str):
+    """Point the app at the fake API, embedded Qdrant and a scratch folder."""
+    env = {
+        "OPENAI_API_KEY": "sk-benchmark",
+        "OPENAI_BASE_URL": server.base_url,
+        "OPENAI_API_BASE": server.base_url,
+        "EMBEDDING_BACKEND": args.embedding_backend,
+        "OPENAI_EMBEDDING_DIMENSIONS": str(args.dim),
+        "COLLECTION_NAME": "benchmark",
+        "EMBED_CACHE_PATH": "",
+        "MANIFEST_PATH": os.path.join(workdir, "manifest.sqlite3"),
+        "REGISTRY_PATH": os.path.join(workdir, "registry.sqlite3"),
+        "JOBS_FOLDER": os.path.join(workdir, "jobs"),
+        "INGEST_WORKERS": str(args.ingest_workers),
+        "WARMUP": "0",
+        "HYBRID_SEARCH": "1" if args.hybrid else "0",
+    }
+    if args.qdrant_url:
+        env["QDRANT_URL"] = args.qdrant_url
+        env["QDRANT_API_KEY"] = args.qdrant_api_key or ""
+    else:
+        env["QDRANT_PATH"] = args.qdrant_path or ":memory:"
+        # The embedded client is not built for concurrent writers
+        env["UPSERT_IN_FLIGHT"] = "1"
+    if args.rerank_backend:
+        env["RERANK_BACKEND"] = args.rerank_backend
+    os.environ.update(env)
+
+
+def instrument(app_module, timer: StageTimer):
+    """Wrap the app's components so each stage's calls are timed."""
+    import extractor as extractor_module
+
+    for table in (extractor_module.EXTRACTORS, extractor_module.STRUCTURED_EXTRACTORS):
+        for ext, extractor in list(table.items()):
+            table[ext] = timer.wrap_iter("extract", extractor)
+
+    splitter = app_module.text_splitter.get()
+    splitter.split_text = timer.wrap("chunk", splitter.split_text)
+
+    embedder = app_module.embeddings.get()
+    embedder.embed_documents = timer.wrap("embed", embedder.embed_documents)
+
+    client = app_module.qdrant_client
+    client.upsert = timer.wrap("upsert", client.upsert)
+    client.query_points = timer.wrap("search", client.query_points)
+
+    reranker = app_module.reranker.get()
+    reranker.rerank_many = timer.wrap("rerank", reranker.rerank_many)
+
+    completions = app_module.llm.get().chat.completions
+    completions.create = timer.wrap("llm", completions.create)
+
+
+def run_ingest(flask_app, files: list[str], batch_size: int) -> dict:
+    client = flask_app.test_client()
+    chunks = 0
+    failed = []
+    request_seconds = []
+
+    start = time.perf_counter()
+    for offset in range(0, len(files), batch_size):
+        batch = files[offset:offset + batch_size]
+        handles = [open(path, "rb") for path in batch]
+        data = {"files": [(f, os.path.basename(f.name)) for f in handles]}
+        for index, path in enumerate(batch):
+            data[f"descriptions_{index}"] = f"Benchmark document {os.path.basename(path)}"
+
+        request_start = time.perf_counter()
+        try:
+            response = client.post(
+                "/save_vector", data=data, content_type="multipart/form-data"
+            )
+        finally:
+            for f in handles:
+                f.close()
+        request_seconds.append(time.perf_counter() - request_start)
+
+        body = response.get_json() or {}
+        chunks += sum(item["chunks_inserted"] for item in body.get("success", []))
+        failed.extend(body.get("failed", []))
+    elapsed = time.perf_counter() - start
+
+    size = sum(os.path.getsize(path) for path in files)
+    return {
+        "files": len(files),
+        "failed": failed,
+        "chunks": chunks,
+        "bytes": size,
+        "wall_s": round(elapsed, 3),
+        "files_per_s": round(len(files) / elapsed, 3),
+        "chunks_per_s": round(chunks / elapsed, 2),
+        "mb_per_s": round(size / 1e6 / elapsed, 3),
+        "request": summarize(request_seconds),
+    }
+
+
+def run_chat(flask_app, queries: list[str], concurrency: int) -> dict:
+    local = threading.local()
+    errors = []
+
+    def ask(query):
+        if not hasattr(local, "client"):
+            local.client = flask_app.test_client()
+        start = time.perf_counter()
+        response = local.client.post("/chat", json={"query_text": query, "target_files": []})
+        elapsed = time.perf_counter() - start
+        if response.status_code != 200:
+            errors.append(response.status_code)
+        return elapsed
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(ask, queries))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "queries": len(queries),
+        "concurrency": concurrency,
+        "errors": len(errors),
+        "wall_s": round(elapsed, 3),
+        "queries_per_s": round(len(queries) / elapsed, 3),
+        "latency": summarize(latencies),
+    }
+
+
+def peak_rss_mb(who) -> float:
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return round(resource.getrusage(who).ru_maxrss * scale / 1e6, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline ingest/chat benchmark")
+    parser.add_argument("--docs", type=int, default=2, help="documents per format")
+    parser.add_argument("--paragraphs", type=int, default=40,
+                        help="paragraphs per document (x5 records for tabular formats)")
+    parser.add_argument("--formats", nargs="+", default=list(FORMATS), choices=FORMATS)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--ingest-batch", type=int, default=4, help="files per /save_vector call")
+    parser.add_argument("--ingest-workers", type=int, default=2)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--embed-latency-ms", type=float, default=0)
+    parser.add_argument("--llm-latency-ms", type=float, default=0)
+    parser.add_argument("--token-latency-ms", type=float, default=0)
+    parser.add_argument("--embedding-backend", default="openai", choices=["openai", "local"])
+    parser.add_argument("--rerank-backend")
+    parser.add_argument("--no-hybrid", dest="hybrid", action="store_false")
+    parser.add_argument("--qdrant-path", help='embedded Qdrant directory (default ":memory:")')
+    parser.add_argument("--qdrant-url", help="benchmark against a Qdrant server instead")
+    parser.add_argument("--qdrant-api-key")
+    parser.add_argument("--workdir", help="scratch folder (default: a new temp dir)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="rag-bench-"))
+    output = os.path.abspath(args.output) if args.output else None
+    corpus = make_corpus(
+        os.path.join(workdir, "corpus"), args.docs, args.paragraphs, args.formats, args.seed
+    )
+    queries = make_queries(corpus["sentences"], args.queries, args.seed)
+
+    sys.path.insert(0, REPO_ROOT)
+    import extractor
+
+    # The PDF workers are forked, so they must start before the fake API
+    # server's thread; importing the app then reuses them
+    extractor.start_pdf_pool()
+
+    server = FakeOpenAIServer(
+        dim=args.dim,
+        embed_latency_ms=args.embed_latency_ms,
+        llm_latency_ms=args.llm_latency_ms,
+        token_latency_ms=args.token_latency_ms
+    ).start()
+    configure_environment(args, server, workdir)
+
+    # The app keeps its upload folders relative to the working directory
+    app_dir = os.path.join(workdir, "app")
+    os.makedirs(app_dir, exist_ok=True)
+    os.chdir(app_dir)
+
+    start = time.perf_counter()
+    import app as app_module
+    import_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    app_module.run_warmup()
+    warmup_seconds = time.perf_counter() - start
+
+    timer = StageTimer()
+    instrument(app_module, timer)
+
+    ingest = run_ingest(app_module.app, corpus["files"], args.ingest_batch)
+    ingest["stages"] = timer.report()
+    timer.reset()
+
+    chat = run_chat(app_module.app, queries, args.concurrency)
+    chat["stages"] = timer.report()
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": vars(args),
+        "import_s": round(import_seconds, 3),
+        "warmup_s": round(warmup_seconds, 3),
+        "ingest": ingest,
+        "chat": chat,
+        "fake_openai": {"requests": server.requests, "embedded_inputs": server.embedded_inputs},
+        "peak_rss_mb": peak_rss_mb(resource.RUSAGE_SELF),
+        "peak_rss_children_mb": peak_rss_mb(resource.RUSAGE_CHILDREN),
+    }
+    server.shutdown()
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if output:
+        with open(output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+# chunk_store.py
+"""Chunk text kept on local disk instead of in Qdrant payloads.
+
+Texts are appended to a data file and read back through ``mmap``; an SQLite
+index maps each point id to (offset, length). Records can be zlib-compressed.
+Point ids are content hashes shared by every collection version, so ingest
+never deletes texts: ``compact`` rewrites the data file with only the ids
+some version still references (``python reindex.py compact-store``). Appends
+take an exclusive ``flock`` so several server processes can share one store.
+
+    python chunk_store.py stats
+"""
+import argparse
+import mmap
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process use only
+    fcntl = None
+
+# SQLite's default limit on bound parameters is 999
+LOOKUP_BATCH = 500
+
+
+class ChunkStore:
+    def __init__(self, folder: str, compress: bool = False, compress_level: int = 6):
+        self.folder = folder
+        self.compress = compress
+        self.compress_level = compress_level
+        os.makedirs(folder, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._map = None
+        self._map_generation = None
+        self._conn = sqlite3.connect(
+            os.path.join(folder, "index.sqlite3"), check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " point_id TEXT PRIMARY KEY,"
+            " offset INTEGER NOT NULL,"
+            " length INTEGER NOT NULL,"
+            " compressed INTEGER NOT NULL,"
+            " added REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS meta ("
+            " key TEXT PRIMARY KEY,"
+            " value INTEGER NOT NULL);"
+            "INSERT OR IGNORE INTO meta (key, value) VALUES ('generation', 0);"
+        )
+        self._conn.commit()
+
+    def _data_path(self, generation: int) -> str:
+        return os.path.join(self.folder, f"chunks.{generation}.dat")
+
+    def _generation(self) -> int:
+        return self._conn.execute(
+            "SELECT value FROM meta WHERE key = 'generation'"
+        ).fetchone()[0]
+
+    def _encode(self, text: str) -> tuple[bytes, int]:
+        data = text.encode("utf-8")
+        if self.compress:
+            packed = zlib.compress(data, self.compress_level)
+            if len(packed) < len(data):
+                return packed, 1
+        return data, 0
+
+    def put_many(self, items: dict[str, str]):
+        """Store ``point_id -> text``; ids already stored are only touched."""
+        if not items:
+            return
+        with self._lock:
+            _, f = self._open_locked()
+            with f:
+                try:
+                    # Held across the lookup too, so a compaction in another
+                    # process can't drop an id between lookup and touch
+                    known = self._known(list(items))
+                    now = time.time()
+                    rows = []
+                    offset = f.seek(0, os.SEEK_END)
+                    chunks = []
+                    for pid, text in items.items():
+                        if pid in known:
+                            continue
+                        data, compressed = self._encode(text)
+                        rows.append((pid, offset, len(data), compressed, now))
+                        chunks.append(data)
+                        offset += len(data)
+                    if chunks:
+                        f.write(b"".join(chunks))
+                        f.flush()
+                        os.fsync(f.fileno())
+                    # Indexed while the lock is held, so no reader finds an
+                    # offset past the end of the file. Re-stored ids count as
+                    # new, so a running compaction keeps them
+                    self._conn.executemany(
+                        "UPDATE chunks SET added = ? WHERE point_id = ?",
+                        [(now, pid) for pid in known]
+                    )
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO chunks"
+                        " (point_id, offset, length, compressed, added)"
+                        " VALUES (?, ?, ?, ?, ?)", rows
+                    )
+                    self._conn.commit()
+                finally:
+                    if fcntl:
+                        fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _open_locked(self):
+        """(generation, current data file opened for append with its flock held).
+
+        Retries when a compaction in another process switched to a new file
+        while we waited for the lock.
+        """
+        while True:
+            generation = self._generation()
+            path = self._data_path(generation)
+            f = open(path, "ab")
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            if self._generation() == generation:
+                return generation, f
+            f.close()
+            if os.path.exists(path) and not os.path.getsize(path):
+                # Opening recreated the file the compaction had removed
+                os.remove(path)
+
+    def _known(self, point_ids: list[str]) -> set[str]:
+        known = set()
+        for start in range(0, len(point_ids), LOOKUP_BATCH):
+            batch = point_ids[start:start + LOOKUP_BATCH]
+            known.update(row[0] for row in self._conn.execute(
+                f"SELECT point_id FROM chunks WHERE point_id IN ({','.join('?' * len(batch))})",
+                batch
+            ))
+        return known
+
+    def _mapped(self, generation: int, end: int):
+        """Memory map of the data file covering at least ``end`` bytes."""
+        if self._map is None or self._map_generation != generation or len(self._map) < end:
+            if self._map is not None:
+                self._map.close()
+            with open(self._data_path(generation), "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._map_generation = generation
+        return self._map
+
+    def _locations(self, point_ids: list[str]) -> tuple[int, list]:
+        """Generation and (id, offset, length, compressed) rows, from one snapshot."""
+        self._conn.execute("BEGIN")
+        try:
+            generation = self._generation()
+            rows = []
+            for start in range(0, len(point_ids), LOOKUP_BATCH):
+                batch = point_ids[start:start + LOOKUP_BATCH]
+                rows.extend(self._conn.execute(
+                    "SELECT point_id, offset, length, compressed FROM chunks"
+                    f" WHERE point_id IN ({','.join('?' * len(batch))})",
+                    batch
+                ))
+        finally:
+            self._conn.commit()
+        return generation, rows
+
+    def get_many(self, point_ids) -> dict[str, str]:
+        """Texts of the stored ``point_ids``; unknown ids are left out."""
+        point_ids = [str(pid) for pid in point_ids]
+        if not point_ids:
+            return {}
+        with self._lock:
+            while True:
+                generation, rows = self._locations(point_ids)
+                if not rows:
+                    return {}
+                try:
+                    data = self._mapped(
+                        generation, max(offset + length for _, offset, length, _ in rows)
+                    )
+                    break
+                except FileNotFoundError:
+                    # Compacted away between the lookup and the open
+                    continue
+
+            texts = {}
+            for pid, offset, length, compressed in rows:
+                raw = data[offset:offset + length]
+                if compressed:
+                    raw = zlib.decompress(raw)
+                texts[pid] = raw.decode("utf-8")
+            return texts
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, live = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM chunks"
+            ).fetchone()
+            path = self._data_path(self._generation())
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        return {"chunks": count, "live_bytes": live, "file_bytes": size,
+                "garbage_bytes": size - live}
+
+    def compact(self, referenced, added_before: float) -> dict:
+        """Rewrite the data file keeping only ``referenced`` ids.
+
+        Texts added at or after ``added_before`` are kept regardless: ingest
+        stores them before writing their points, so a scan of the
+        collections started earlier can't have seen them.
+        """
+        referenced = {str(pid) for pid in referenced}
+        with self._lock:
+            generation, lock_file = self._open_locked()
+            old_path = self._data_path(generation)
+            new_path = self._data_path(generation + 1)
+            with lock_file:
+                try:
+                    rows = self._conn.execute(
+                        "SELECT point_id, offset, length, added FROM chunks ORDER BY offset"
+                    ).fetchall()
+                    dropped = [(pid,) for pid, _, _, added in rows
+                               if added < added_before and pid not in referenced]
+                    dropped_ids = {pid for pid, in dropped}
+                    rows = [(pid, offset, length) for pid, offset, length, _ in rows
+                            if pid not in dropped_ids]
+                    updates = []
+                    with open(old_path, "rb") as src, open(new_path, "wb") as dst:
+                        for pid, offset, length in rows:
+                            src.seek(offset)
+                            updates.append((dst.tell(), pid))
+                            dst.write(src.read(length))
+                        dst.flush()
+                        os.fsync(dst.fileno())
+
+                    # Offsets and generation switch together; readers of the
+                    # old generation remap on their next lookup
+                    with self._conn:
+                        self._conn.executemany(
+                            "DELETE FROM chunks WHERE point_id = ?", dropped
+                        )
+                        self._conn.executemany(
+                            "UPDATE chunks SET offset = ? WHERE point_id = ?", updates
+                        )
+                        self._conn.execute(
+                            "UPDATE meta SET value = ? WHERE key = 'generation'",
+                            (generation + 1,)
+                        )
+                    # Removed while locked, so writers waiting on it find the
+                    # new generation instead of recreating the file
+                    os.remove(old_path)
+                finally:
+                    if fcntl:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return self.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local chunk text store")
+    parser.add_argument("command", choices=["stats"])
+    parser.add_argument("--path", default=os.getenv("CHUNK_STORE_PATH", "data/chunks"))
+    args = parser.parse_args()
+
+    # Compaction needs the ids Qdrant references: python reindex.py compact-store
+    print(ChunkStore(args.path).stats())
+
+
+if __name__ == "__main__":
+    main()
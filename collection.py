@@ -1,26 +1,29 @@
-from qdrant_client import QdrantClient, models
+from qdrant_client import QdrantClient
 from dotenv import load_dotenv
+from embeddings import embeddings
+from provisioning import COLLECTION_NAME, ensure_collection
 import os
 
 load_dotenv()
 
 QDRANT_URL = os.getenv("QDRANT_URL")
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1") == "1"
 
 client = QdrantClient(
     url=QDRANT_URL,
     api_key=QDRANT_API_KEY
 )
 
-COLLECTION_NAME = "Document"
-
-# Create new collection (1536-dim)
-client.create_collection(
-    collection_name=COLLECTION_NAME,
-    vectors_config=models.VectorParams(
-        size=1536,
-        distance=models.Distance.COSINE
-    )
-)
-
-print("Collection recreated with 1536 dimensions")
+# Create the first version behind the COLLECTION_NAME alias, sized for the
+# configured embedding backend, with the storage options from provisioning.py.
+# An existing collection is rebuilt with reindex.py instead, without downtime.
+if ensure_collection(
+    client,
+    COLLECTION_NAME,
+    vector_size=embeddings.embedding_size,
+    hybrid=HYBRID_SEARCH
+):
+    print(f"Collection created with {embeddings.embedding_size} dimensions")
+else:
+    print(f"{COLLECTION_NAME} already exists; rebuild it with 'python reindex.py build --swap'")
@@ -0,0 +1,163 @@
+# context_builder.py
+"""Pack reranked chunks into a token-budgeted prompt context.
+
+Chunks from the same file and page that overlap (the splitter repeats up to
+``chunk_overlap`` characters between neighbours) are stitched back into one
+contiguous span, spans that mostly repeat a better-ranked span are dropped,
+and the rest are added in rerank order until the token budget is full.
+"""
+import logging
+import os
+import re
+import threading
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+# Share of a span's word shingles already in context that makes it a duplicate
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))
+# Shortest suffix/prefix match treated as splitter overlap rather than chance
+CONTEXT_MIN_OVERLAP = int(os.getenv("CONTEXT_MIN_OVERLAP", "20"))
+CONTEXT_TOKENIZER_MODEL = os.getenv(
+    "CONTEXT_TOKENIZER_MODEL", os.getenv("CHAT_MODEL", "gpt-4o-mini")
+)
+
+SEPARATOR = "\n\n"
+SHINGLE_SIZE = 3
+WORD_RE = re.compile(r"\w+")
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def get_encoding():
+    """tiktoken encoding for the chat model, or None to fall back to estimates."""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        with _encoding_lock:
+            if not _encoding_loaded:
+                try:
+                    import tiktoken
+
+                    try:
+                        _encoding = tiktoken.encoding_for_model(CONTEXT_TOKENIZER_MODEL)
+                    except KeyError:
+                        _encoding = tiktoken.get_encoding("o200k_base")
+                except Exception as e:
+                    logging.warning("tiktoken unavailable (%s); estimating context tokens", e)
+                    _encoding = None
+                _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    encoding = get_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, budget: int) -> str:
+    encoding = get_encoding()
+    if encoding is None:
+        return text[:budget * 4]
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:budget])
+
+
+def overlap_length(left: str, right: str, min_overlap: int = CONTEXT_MIN_OVERLAP) -> int:
+    """Length of the longest suffix of ``left`` that is a prefix of ``right``."""
+    if min(len(left), len(right)) < min_overlap:
+        return 0
+    probe = right[:min_overlap]
+    # The earliest match in the tail gives the longest overlap
+    pos = left.find(probe, max(0, len(left) - len(right)))
+    while pos != -1:
+        if right.startswith(left[pos:]):
+            return len(left) - pos
+        pos = left.find(probe, pos + 1)
+    return 0
+
+
+def merge_spans(spans: list[dict]) -> list[dict]:
+    """Stitch overlapping or nested spans of the same file and page together.
+
+    A merged span keeps the best (lowest) rank of its parts.
+    """
+    spans = list(spans)
+    merged = True
+    while merged:
+        merged = False
+        for i, a in enumerate(spans):
+            for j, b in enumerate(spans):
+                if i == j or a["key"] != b["key"]:
+                    continue
+                if b["text"] in a["text"]:
+                    text = a["text"]
+                else:
+                    k = overlap_length(a["text"], b["text"])
+                    if not k:
+                        continue
+                    text = a["text"] + b["text"][k:]
+                spans[i] = {
+                    "key": a["key"],
+                    "text": text,
+                    "rank": min(a["rank"], b["rank"]),
+                    "hits": a["hits"] + b["hits"]
+                }
+                del spans[j]
+                merged = True
+                break
+            if merged:
+                break
+    return sorted(spans, key=lambda span: span["rank"])
+
+
+def shingles(text: str) -> set:
+    words = WORD_RE.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def build_context(hits, budget: int = CONTEXT_TOKEN_BUDGET,
+                  dedup_threshold: float = CONTEXT_DEDUP_THRESHOLD) -> tuple[str, list]:
+    """Return the context text and the hits it was built from, in rerank order."""
+    ranks = {id(hit): rank for rank, hit in enumerate(hits)}
+    spans = merge_spans([
+        {
+            "key": (hit.payload.get("filename"), hit.payload.get("page")),
+            "text": hit.payload["text"],
+            "rank": ranks[id(hit)],
+            "hits": [hit]
+        } for hit in hits
+    ])
+
+    parts, used, seen = [], [], set()
+    remaining = budget
+    separator_tokens = count_tokens(SEPARATOR)
+    for span in spans:
+        words = shingles(span["text"])
+        if words and len(words & seen) >= dedup_threshold * len(words):
+            continue
+
+        cost = count_tokens(span["text"]) + (separator_tokens if parts else 0)
+        if cost > remaining:
+            # Smaller spans further down may still fit
+            continue
+        parts.append(span["text"])
+        used.extend(span["hits"])
+        seen |= words
+        remaining -= cost
+
+    if not parts and spans:
+        # Even the best span is over budget: send its beginning, citing
+        # only the chunks that start inside it
+        span = spans[0]
+        prefix = truncate_tokens(span["text"], budget)
+        parts.append(prefix)
+        used.extend(
+            hit for hit in span["hits"]
+            if -1 < span["text"].find(hit.payload["text"]) < len(prefix)
+        )
+
+    used.sort(key=lambda hit: ranks[id(hit)])
+    return SEPARATOR.join(parts), used
@@ -1,5 +1,7 @@
 # embeddings.py
-from langchain_openai import OpenAIEmbeddings
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from embedding_cache import EmbeddingCache
 from dotenv import load_dotenv
 import os
 
@@ -7,27 +9,240 @@ load_dotenv()
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-class EmbeddingWrapper:
-    def __init__(self):
-        self.model_name = "text-embedding-3-small"
-        self.embedding_size = 1536
+# openai | local
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai")
+OPENAI_EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
+# text-embedding-3 models can return shortened vectors; 0 keeps the native size
+OPENAI_EMBEDDING_DIMENSIONS = int(os.getenv("OPENAI_EMBEDDING_DIMENSIONS", "0"))
+OPENAI_NATIVE_DIMENSIONS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+}
+
+# Local sentence-transformers bi-encoder
+LOCAL_EMBEDDING_MODEL = os.getenv("LOCAL_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+# torch | onnx | onnx-int8
+LOCAL_EMBEDDING_RUNTIME = os.getenv("LOCAL_EMBEDDING_RUNTIME", "torch")
+LOCAL_EMBEDDING_ONNX_INT8_FILE = os.getenv(
+    "LOCAL_EMBEDDING_ONNX_INT8_FILE", "onnx/model_qint8_avx512_vnni.onnx"
+)
+LOCAL_EMBEDDING_THREADS = int(os.getenv("LOCAL_EMBEDDING_THREADS", "0"))
+LOCAL_EMBEDDING_BATCH_SIZE = int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", "32"))
+
+# Batching limits for embed_documents. Token counts are estimated (~4 chars
+# per token) so batches stay well below the API's per-request input cap.
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "128"))
+EMBED_BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", "100000"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+# Per-request timeout (seconds) and retries for the embedding API
+EMBED_TIMEOUT = float(os.getenv("EMBED_TIMEOUT", "30"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "2"))
+
+# Persistent embedding cache; set EMBED_CACHE_PATH="" to disable
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "cache/embeddings.sqlite3")
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "200000"))
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
 
+class OpenAIBackend:
+    name = "openai"
+    # Remote API: several requests in flight help
+    max_concurrency = EMBED_CONCURRENCY
+
+    def __init__(self, model_name: str = OPENAI_EMBEDDING_MODEL,
+                 dimensions: int = OPENAI_EMBEDDING_DIMENSIONS):
+        from langchain_openai import OpenAIEmbeddings
+
+        self.model_name = model_name
+        self.embedding_size = dimensions or OPENAI_NATIVE_DIMENSIONS.get(model_name, 1536)
         self._embeddings = OpenAIEmbeddings(
             api_key=OPENAI_API_KEY,
-            model=self.model_name
+            model=self.model_name,
+            dimensions=dimensions or None,
+            request_timeout=EMBED_TIMEOUT,
+            max_retries=EMBED_MAX_RETRIES
+        )
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embeddings.embed_query(text)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return await self._embeddings.aembed_query(text)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self._embeddings.embed_documents(texts)
+
+
+class LocalBackend:
+    name = "local"
+    # In-process model already uses every core it is given
+    max_concurrency = 1
+
+    def __init__(self, model_name: str = LOCAL_EMBEDDING_MODEL,
+                 runtime: str = LOCAL_EMBEDDING_RUNTIME,
+                 threads: int = LOCAL_EMBEDDING_THREADS):
+        from sentence_transformers import SentenceTransformer
+
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+
+        if runtime == "torch":
+            self._model = SentenceTransformer(model_name)
+        elif runtime == "onnx":
+            self._model = SentenceTransformer(model_name, backend="onnx")
+        elif runtime == "onnx-int8":
+            self._model = SentenceTransformer(
+                model_name,
+                backend="onnx",
+                model_kwargs={"file_name": LOCAL_EMBEDDING_ONNX_INT8_FILE}
+            )
+        else:
+            raise ValueError(f"Unknown local embedding runtime: {runtime}")
+
+        self.model_name = model_name
+        self.embedding_size = self._model.get_sentence_embedding_dimension()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        vectors = self._model.encode(
+            texts,
+            batch_size=LOCAL_EMBEDDING_BATCH_SIZE,
+            normalize_embeddings=True,
+            convert_to_numpy=True
         )
+        return vectors.tolist()
 
     def embed_query(self, text: str) -> list[float]:
-        vector = self._embeddings.embed_query(text)
+        return self.embed_documents([text])[0]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        # CPU-bound; keep it off the event loop
+        return await asyncio.to_thread(self.embed_query, text)
+
+
+BACKENDS = {
+    "openai": OpenAIBackend,
+    "local": LocalBackend,
+}
+
 
+class EmbeddingWrapper:
+    def __init__(self, backend=None):
+        if backend is None:
+            if EMBEDDING_BACKEND not in BACKENDS:
+                raise ValueError(f"Unknown embedding backend: {EMBEDDING_BACKEND}")
+            backend = BACKENDS[EMBEDDING_BACKEND]()
+
+        self.backend = backend
+        self.model_name = backend.model_name
+        self.embedding_size = backend.embedding_size
+        # Identifies the vector space; stored on every point so collections
+        # never mix embeddings from different backends
+        self.signature = f"{backend.name}:{self.model_name}:{self.embedding_size}"
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=backend.max_concurrency,
+            thread_name_prefix="embed"
+        )
+        self.cache = (
+            EmbeddingCache(EMBED_CACHE_PATH, EMBED_CACHE_MAX_ENTRIES)
+            if EMBED_CACHE_PATH else None
+        )
+
+    def _cache_key(self, text: str) -> str:
+        return EmbeddingCache.make_key(self.model_name, self.embedding_size, text)
+
+    def _validate(self, vector: list[float]) -> list[float]:
         if not vector or len(vector) != self.embedding_size:
             raise ValueError(
                 f"Embedding size mismatch: {len(vector) if vector else None}"
             )
+        return vector
+
+    def embed_query(self, text: str) -> list[float]:
+        if self.cache is None:
+            return self._validate(self.backend.embed_query(text))
 
+        key = self._cache_key(text)
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = self._validate(self.backend.embed_query(text))
+            self.cache.put(key, vector)
         return vector
 
+    async def aembed_query(self, text: str) -> list[float]:
+        """Async embed_query for the ASGI server, sharing the same cache."""
+        if self.cache is None:
+            return self._validate(await self.backend.aembed_query(text))
 
-embeddings = EmbeddingWrapper()
- 
+        key = self._cache_key(text)
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = self._validate(await self.backend.aembed_query(text))
+            self.cache.put(key, vector)
+        return vector
+
+    def _make_batches(self, texts: list[str]):
+        batch, batch_tokens = [], 0
+        for text in texts:
+            tokens = estimate_tokens(text)
+            if batch and (
+                len(batch) >= EMBED_BATCH_SIZE
+                or batch_tokens + tokens > EMBED_BATCH_TOKENS
+            ):
+                yield batch
+                batch, batch_tokens = [], 0
+            batch.append(text)
+            batch_tokens += tokens
+        if batch:
+            yield batch
 
+    def _embed_batch(self, batch: list[str]) -> list[list[float]]:
+        vectors = self.backend.embed_documents(batch)
+        if len(vectors) != len(batch):
+            raise ValueError(
+                f"Embedding count mismatch: expected {len(batch)}, got {len(vectors)}"
+            )
+        return [self._validate(v) for v in vectors]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Embed many texts in size/token-bounded batches, several at a time.
+
+        Output order matches ``texts``. Cached vectors are reused and only
+        the missing texts are sent to the API.
+        """
+        if self.cache is None:
+            return self._embed_uncached(texts)
+
+        keys = [self._cache_key(text) for text in texts]
+        found = self.cache.get_many(keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+
+        if missing:
+            vectors = self._embed_uncached(list(missing.values()))
+            fresh = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(fresh)
+            found.update(fresh)
+
+        return [found[key] for key in keys]
+
+    def _embed_uncached(self, texts: list[str]) -> list[list[float]]:
+        batches = list(self._make_batches(texts))
+        if not batches:
+            return []
+        if len(batches) == 1:
+            results = [self._embed_batch(batches[0])]
+        else:
+            results = self._executor.map(self._embed_batch, batches)
+        return [vector for batch in results for vector in batch]
+
+
+embeddings = EmbeddingWrapper()
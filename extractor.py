@@ -1,29 +1,311 @@
 import PyPDF2
 import docx
-import pandas as pd
+import ijson
+import codecs
+import csv
+import io
 import json
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
-def extract_text_from_pdf(file):
-    reader = PyPDF2.PdfReader(file)
-    return "\n".join(
-        page.extract_text() or "" for page in reader.pages
+# Page-parallel PDF extraction
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 1)))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+
+# Block sizes for the streaming extractors
+TEXT_BLOCK_SIZE = 64 * 1024
+TABLE_ROWS_PER_BLOCK = int(os.getenv("TABLE_ROWS_PER_BLOCK", "500"))
+
+# Structure-aware chunking for tables, JSON and DOCX (see STRUCTURED_EXTRACTORS)
+STRUCTURED_CHUNKING = os.getenv("STRUCTURED_CHUNKING", "1") == "1"
+# JSON subtrees longer than this are split into their children
+JSON_UNIT_CHARS = int(os.getenv("JSON_UNIT_CHARS", "1000"))
+
+_pdf_pool = None
+
+def start_pdf_pool():
+    """Fork the PDF worker processes; call before the process starts any thread.
+
+    Workers are forked so they don't re-import the Flask app as __main__.
+    Forking once other threads run can leave a child holding a lock (the
+    import lock, a logging handler's) that no thread in it will release.
+    """
+    global _pdf_pool
+    if _pdf_pool is not None or PDF_WORKERS <= 1 \
+            or "fork" not in multiprocessing.get_all_start_methods():
+        return _pdf_pool
+    _pdf_pool = ProcessPoolExecutor(
+        max_workers=PDF_WORKERS,
+        mp_context=multiprocessing.get_context("fork")
     )
+    # With fork, the first submit starts every worker at once
+    _pdf_pool.submit(int).result()
+    return _pdf_pool
+
+def get_pdf_pool():
+    """The pool from start_pdf_pool(), or None to extract in this process"""
+    return _pdf_pool
+
+def _extract_pdf_page_range(path, start, end):
+    with open(path, "rb") as f:
+        reader = PyPDF2.PdfReader(f)
+        return [
+            (number + 1, reader.pages[number].extract_text() or "")
+            for number in range(start, end)
+        ]
+
+def iter_pages_from_pdf(path):
+    """Yield (page_number, text) in page order, splitting pages across processes"""
+    with open(path, "rb") as f:
+        page_count = len(PyPDF2.PdfReader(f).pages)
+
+    pool = get_pdf_pool()
+    if pool is None or page_count <= PDF_PAGES_PER_TASK:
+        for start in range(0, page_count, PDF_PAGES_PER_TASK):
+            yield from _extract_pdf_page_range(
+                path, start, min(start + PDF_PAGES_PER_TASK, page_count)
+            )
+        return
+
+    # Keep a bounded window of page ranges in flight
+    starts = iter(range(0, page_count, PDF_PAGES_PER_TASK))
+    pending = deque()
+
+    def submit_next():
+        start = next(starts, None)
+        if start is not None:
+            pending.append(pool.submit(
+                _extract_pdf_page_range, path, start,
+                min(start + PDF_PAGES_PER_TASK, page_count)
+            ))
+
+    for _ in range(PDF_WORKERS * 2):
+        submit_next()
+    while pending:
+        pages = pending.popleft().result()
+        submit_next()
+        yield from pages
+
+# Streaming extractors: each yields (page_number or None, text) sections
+# whose concatenation is the document text.
+def iter_text_from_docx(path):
+    doc = docx.Document(path)
+    for p in doc.paragraphs:
+        yield None, p.text + "\n"
+
+def iter_text_from_txt(path):
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(TEXT_BLOCK_SIZE)
+            if not block:
+                break
+            yield None, decoder.decode(block)
+    yield None, decoder.decode(b"", final=True)
+
+def iter_text_from_csv(path):
+    import pandas as pd
+    for block in pd.read_csv(path, chunksize=TABLE_ROWS_PER_BLOCK):
+        yield None, block.to_string(index=False) + "\n"
+
+def iter_text_from_xlsx(path):
+    # pandas and openpyxl are slow to import; load them on first use
+    import openpyxl
+    import pandas as pd
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = ["" if c is None else str(c) for c in header]
+
+        block = []
+        for row in rows:
+            block.append(row)
+            if len(block) >= TABLE_ROWS_PER_BLOCK:
+                yield None, pd.DataFrame(block, columns=columns).to_string(index=False) + "\n"
+                block = []
+        if block:
+            yield None, pd.DataFrame(block, columns=columns).to_string(index=False) + "\n"
+    finally:
+        workbook.close()
+
+def _first_significant_byte(f):
+    while True:
+        byte = f.read(1)
+        if not byte or not byte.isspace():
+            return byte
+
+def iter_text_from_json(path):
+    with open(path, "rb") as f:
+        first = _first_significant_byte(f)
+        f.seek(0)
+        if first == b"[":
+            for item in ijson.items(f, "item", use_float=True):
+                yield None, json.dumps(item, indent=2) + "\n"
+        elif first == b"{":
+            for key, value in ijson.kvitems(f, "", use_float=True):
+                yield None, json.dumps({key: value}, indent=2) + "\n"
+        else:
+            yield None, json.dumps(json.load(f), indent=2)
+
+# Structured extractors: each yields (page_number or None, context, text)
+# units. A unit is a table row, a JSON subtree or a DOCX paragraph, and its
+# context (table columns, heading path) is repeated at the top of every
+# chunk the unit lands in; see pipeline.iter_structured_chunks.
+def _cell(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value).strip()
+
+def _csv_line(values) -> str:
+    values = list(values)
+    while values and values[-1] == "":
+        values.pop()
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="").writerow(values)
+    return buffer.getvalue()
+
+def _table_units(rows, name: str = None):
+    """Header row as context, one compact CSV line per data row"""
+    header = None
+    for row in rows:
+        values = [_cell(v) for v in row]
+        if not any(values):
+            continue
+        if header is None:
+            header = _csv_line(values)
+            context = f"Sheet: {name}\n{header}" if name else header
+            continue
+        yield None, context, _csv_line(values)
+
+def iter_units_from_csv(path):
+    with open(path, newline="", encoding="utf-8-sig", errors="replace") as f:
+        yield from _table_units(csv.reader(f))
+
+def iter_units_from_xlsx(path):
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            yield from _table_units(sheet.iter_rows(values_only=True), sheet.title)
+    finally:
+        workbook.close()
+
+def _json_path(path: str, key) -> str:
+    if isinstance(key, int):
+        return f"{path}[{key}]"
+    if key.isidentifier():
+        return f"{path}.{key}"
+    return f"{path}[{json.dumps(key, ensure_ascii=False)}]"
+
+def _json_units(value, path: str):
+    """``path = compact JSON``, descending into subtrees over JSON_UNIT_CHARS"""
+    text = json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+    if len(text) <= JSON_UNIT_CHARS or not isinstance(value, (dict, list)) or not value:
+        yield None, None, f"{path} = {text}"
+        return
+    items = value.items() if isinstance(value, dict) else enumerate(value)
+    for key, child in items:
+        yield from _json_units(child, _json_path(path, key))
+
+def iter_units_from_json(path):
+    with open(path, "rb") as f:
+        first = _first_significant_byte(f)
+        f.seek(0)
+        if first == b"[":
+            for index, item in enumerate(ijson.items(f, "item", use_float=True)):
+                yield from _json_units(item, f"$[{index}]")
+        elif first == b"{":
+            for key, value in ijson.kvitems(f, "", use_float=True):
+                yield from _json_units(value, _json_path("$", key))
+        else:
+            yield from _json_units(json.load(f), "$")
+
+def _docx_blocks(doc):
+    """Paragraphs and tables in document order"""
+    from docx.oxml.ns import qn
+    from docx.table import Table
+    from docx.text.paragraph import Paragraph
+
+    for child in doc.element.body.iterchildren():
+        if child.tag == qn("w:p"):
+            yield Paragraph(child, doc)
+        elif child.tag == qn("w:tbl"):
+            yield Table(child, doc)
+
+def _heading_level(paragraph):
+    style = paragraph.style.name if paragraph.style is not None else ""
+    if style == "Title":
+        return 0
+    if style.startswith("Heading"):
+        level = style[len("Heading"):].strip()
+        return int(level) if level.isdigit() else 1
+    return None
+
+def iter_units_from_docx(path):
+    """Paragraphs and table rows under their heading path"""
+    from docx.table import Table
 
-def extract_text_from_docx(file):
-    doc = docx.Document(file)
-    return "\n".join(p.text for p in doc.paragraphs)
+    doc = docx.Document(path)
+    headings = []
+    for block in _docx_blocks(doc):
+        context = " > ".join(text for _, text in headings) or None
+        if isinstance(block, Table):
+            header = None
+            for row in block.rows:
+                cells = []
+                for cell in row.cells:
+                    # Merged cells repeat; keep one copy
+                    text = cell.text.strip()
+                    if not cells or cells[-1] != text:
+                        cells.append(text)
+                line = " | ".join(cells)
+                if header is None:
+                    header = line
+                    continue
+                yield None, "\n".join(filter(None, [context, header])), line
+            if header is not None and len(block.rows) == 1:
+                yield None, context, header
+            continue
 
-def extract_text_from_txt(file):
-    return file.read().decode("utf-8", errors="ignore")
+        text = block.text.strip()
+        level = _heading_level(block)
+        if level is not None and text:
+            headings = [(l, t) for l, t in headings if l < level] + [(level, text)]
+        elif text:
+            yield None, context, text
 
-def extract_text_from_csv(file):
-    df = pd.read_csv(file)
-    return df.to_string(index=False)
+# Streaming extractors: path -> (page_number or None, text) sections
+EXTRACTORS = {
+    ".pdf": iter_pages_from_pdf,
+    ".docx": iter_text_from_docx,
+    ".txt": iter_text_from_txt,
+    ".csv": iter_text_from_csv,
+    ".json": iter_text_from_json,
+    ".xlsx": iter_text_from_xlsx,
+}
 
-def extract_text_from_json(file):
-    data = json.load(file)
-    return json.dumps(data, indent=2)
+# PDFs and plain text have no structure beyond pages, which iter_chunks
+# already respects
+STRUCTURED_EXTRACTORS = {
+    ".docx": iter_units_from_docx,
+    ".csv": iter_units_from_csv,
+    ".json": iter_units_from_json,
+    ".xlsx": iter_units_from_xlsx,
+}
 
-def extract_text_from_xlsx(file):
-    df = pd.read_excel(file)
-    return df.to_string(index=False)
+def get_extractor(ext):
+    """(extractor, structured) for a file extension"""
+    if STRUCTURED_CHUNKING and ext in STRUCTURED_EXTRACTORS:
+        return STRUCTURED_EXTRACTORS[ext], True
+    return EXTRACTORS[ext], False
@@ -2,7 +2,7 @@ from dotenv import load_dotenv
 import os
 
 from qdrant_client import QdrantClient
-from qdrant_client.models import PayloadSchemaType
+from provisioning import ensure_payload_indexes
 
 # ---------------- LOAD ENV ----------------
 load_dotenv()
@@ -19,10 +19,6 @@ client = QdrantClient(
 )
 
 # ---------------- CREATE PAYLOAD INDEX ----------------
-client.create_payload_index(
-    collection_name=COLLECTION_NAME,
-    field_name="filename",
-    field_schema=PayloadSchemaType.KEYWORD
-)
+ensure_payload_indexes(client, COLLECTION_NAME)
 
 print("Payload index created for 'filename'")
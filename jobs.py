@@ -0,0 +1,264 @@
+# jobs.py
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
+from datetime import datetime
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows: not enforced
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+FILE_FIELDS = (
+    "job_id", "idx", "filename", "description", "path", "status",
+    "extracted", "chunks_total", "chunks_embedded", "points_upserted", "error"
+)
+
+
+def lock_folder(folder: str):
+    """Take an exclusive lock on ``folder`` for the life of the process.
+
+    Returns the open lock file, which must be kept referenced. Raises
+    RuntimeError when another process already holds it.
+    """
+    os.makedirs(folder, exist_ok=True)
+    lock_file = open(os.path.join(folder, "app.lock"), "w")
+    if fcntl:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            raise RuntimeError(
+                f"Another app process is using {folder}. Run a single worker: "
+                "job resumption, ingest locks, upload locks and answer cache "
+                "invalidation are all in-process."
+            )
+    return lock_file
+
+
+class SwapLock:
+    """Cross-process lock between ingests and ``reindex.py`` alias swaps.
+
+    Every ingest or delete holds ``swap.lock`` shared; a swap holds it
+    exclusively, so it waits for running ingests and new ones wait for it.
+    ``swap.gate`` stops new ingests from starting while a swap waits, so a
+    steady stream of uploads can't starve it.
+    """
+
+    def __init__(self, folder: str):
+        os.makedirs(folder, exist_ok=True)
+        self.gate_path = os.path.join(folder, "swap.gate")
+        self.lock_path = os.path.join(folder, "swap.lock")
+
+    @contextlib.contextmanager
+    def ingest(self):
+        if not fcntl:
+            yield
+            return
+        with open(self.lock_path, "a") as lock_file:
+            with open(self.gate_path, "a") as gate:
+                fcntl.flock(gate, fcntl.LOCK_SH)
+                fcntl.flock(lock_file, fcntl.LOCK_SH)
+            yield
+
+    @contextlib.contextmanager
+    def swap(self, on_wait=None):
+        """Hold off ingestion; ``on_wait()`` is called if ingests are running."""
+        if not fcntl:
+            yield
+            return
+        with open(self.gate_path, "a") as gate, open(self.lock_path, "a") as lock_file:
+            fcntl.flock(gate, fcntl.LOCK_EX)
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                if on_wait:
+                    on_wait()
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+
+class JobStore:
+    """SQLite-backed record of ingestion jobs and per-file progress."""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " created_at TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS job_files ("
+            " job_id TEXT NOT NULL,"
+            " idx INTEGER NOT NULL,"
+            " filename TEXT NOT NULL,"
+            " description TEXT NOT NULL,"
+            " path TEXT NOT NULL,"
+            " status TEXT NOT NULL DEFAULT 'queued',"
+            " extracted INTEGER NOT NULL DEFAULT 0,"
+            " chunks_total INTEGER NOT NULL DEFAULT 0,"
+            " chunks_embedded INTEGER NOT NULL DEFAULT 0,"
+            " points_upserted INTEGER NOT NULL DEFAULT 0,"
+            " error TEXT,"
+            " PRIMARY KEY (job_id, idx));"
+        )
+        self._conn.commit()
+
+    def create(self, job_id: str, files: list[dict]):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, created_at) VALUES (?, ?)",
+                (job_id, datetime.utcnow().isoformat())
+            )
+            self._conn.executemany(
+                "INSERT INTO job_files (job_id, idx, filename, description, path)"
+                " VALUES (?, ?, ?, ?, ?)",
+                [
+                    (job_id, idx, f["filename"], f["description"], f["path"])
+                    for idx, f in enumerate(files)
+                ]
+            )
+            self._conn.commit()
+
+    def update_file(self, job_id: str, idx: int, **fields):
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE job_files SET {columns} WHERE job_id = ? AND idx = ?",
+                (*fields.values(), job_id, idx)
+            )
+            self._conn.commit()
+
+    def files(self, job_id: str = None, statuses: tuple = None) -> list[dict]:
+        query = f"SELECT {', '.join(FILE_FIELDS)} FROM job_files WHERE 1 = 1"
+        params = []
+        if job_id is not None:
+            query += " AND job_id = ?"
+            params.append(job_id)
+        if statuses:
+            query += f" AND status IN ({','.join('?' * len(statuses))})"
+            params.extend(statuses)
+        query += " ORDER BY job_id, idx"
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [dict(zip(FILE_FIELDS, row)) for row in rows]
+
+    def get(self, job_id: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, created_at FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        files = self.files(job_id)
+        for f in files:
+            del f["path"]
+        return {
+            "job_id": row[0],
+            "created_at": row[1],
+            "status": job_status(files),
+            "files": files
+        }
+
+    def recent(self, limit: int = 20) -> list[dict]:
+        with self._lock:
+            ids = [r[0] for r in self._conn.execute(
+                "SELECT id FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+            )]
+        return [self.get(job_id) for job_id in ids]
+
+
+def job_status(files: list[dict]) -> str:
+    statuses = {f["status"] for f in files}
+    if statuses & {"queued", "running"}:
+        return "queued" if statuses == {"queued"} else "running"
+    if statuses == {"done"}:
+        return "completed"
+    if statuses == {"failed"}:
+        return "failed"
+    return "completed_with_errors"
+
+
+class JobQueue:
+    """Runs ingestion jobs on a bounded worker pool.
+
+    ``handler(path, filename, description, progress)`` does the actual work
+    for one file and reports counters through ``progress(**fields)``.
+    Files left queued or running by a previous process are picked up again
+    by ``resume()``.
+    """
+
+    def __init__(self, store: JobStore, handler, folder: str, max_workers: int = 2):
+        self.store = store
+        self.handler = handler
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="ingest"
+        )
+
+    def job_folder(self, job_id: str) -> str:
+        return os.path.join(self.folder, job_id)
+
+    def new_job_id(self) -> str:
+        job_id = uuid.uuid4().hex
+        os.makedirs(self.job_folder(job_id), exist_ok=True)
+        return job_id
+
+    def submit(self, job_id: str, files: list[dict]) -> str:
+        """Record and schedule ``files`` (dicts with filename, description, path)."""
+        self.store.create(job_id, files)
+        for idx in range(len(files)):
+            self._executor.submit(self._run, job_id, idx)
+        return job_id
+
+    def resume(self) -> int:
+        pending = self.store.files(statuses=("queued", "running"))
+        for f in pending:
+            self.store.update_file(
+                f["job_id"], f["idx"], status="queued", extracted=0,
+                chunks_total=0, chunks_embedded=0, points_upserted=0, error=None
+            )
+            self._executor.submit(self._run, f["job_id"], f["idx"])
+        if pending:
+            logger.info("Resumed %d unfinished ingestion file(s)", len(pending))
+        return len(pending)
+
+    def _run(self, job_id: str, idx: int):
+        f = self.store.files(job_id)[idx]
+        self.store.update_file(job_id, idx, status="running")
+
+        def progress(**fields):
+            self.store.update_file(job_id, idx, **fields)
+
+        try:
+            self.handler(f["path"], f["filename"], f["description"], progress)
+            self.store.update_file(job_id, idx, status="done")
+        except Exception as e:
+            logger.exception("Ingestion failed for %s", f["filename"])
+            self.store.update_file(job_id, idx, status="failed", error=str(e))
+        finally:
+            if os.path.exists(f["path"]):
+                os.remove(f["path"])
+            self._cleanup(job_id)
+
+    def _cleanup(self, job_id: str):
+        folder = self.job_folder(job_id)
+        try:
+            if os.path.isdir(folder) and not os.listdir(folder):
+                os.rmdir(folder)
+        except OSError:
+            pass
@@ -0,0 +1,64 @@
+# lazy.py
+"""Deferred construction of heavy components.
+
+Models, API clients and the Qdrant collection check are built on first use
+(or by the background warm-up) instead of at import, so the server starts
+listening straight away and ``/readyz`` can report what is warm.
+"""
+import logging
+import threading
+import time
+
+
+class Lazy:
+    """A component built by ``factory`` on the first ``get()``.
+
+    Thread-safe; a failed build is recorded and retried on the next call.
+    """
+
+    def __init__(self, name: str, factory):
+        self.name = name
+        self._factory = factory
+        self._value = None
+        self._ready = False
+        self._lock = threading.Lock()
+        self.error = None
+        self.load_seconds = None
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    def get(self):
+        if self._ready:
+            return self._value
+        with self._lock:
+            if not self._ready:
+                start = time.perf_counter()
+                try:
+                    self._value = self._factory()
+                except Exception as e:
+                    self.error = str(e)
+                    raise
+                self.load_seconds = round(time.perf_counter() - start, 3)
+                self.error = None
+                self._ready = True
+        return self._value
+
+    def status(self) -> dict:
+        status = {"ready": self._ready}
+        if self.load_seconds is not None:
+            status["load_seconds"] = self.load_seconds
+        if self.error:
+            status["error"] = self.error
+        return status
+
+
+def warm_up(components: list[Lazy]):
+    """Build ``components`` in order; failures are logged, not raised."""
+    for component in components:
+        try:
+            component.get()
+            logging.info("Warmed up %s in %.2fs", component.name, component.load_seconds)
+        except Exception:
+            logging.exception("Warm-up of %s failed", component.name)
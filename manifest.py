@@ -0,0 +1,60 @@
+# manifest.py
+import hashlib
+import os
+import sqlite3
+import threading
+import uuid
+
+# Namespace for deterministic chunk point ids
+CHUNK_NAMESPACE = uuid.UUID("6f1c1f7e-2f0a-4c43-9a4b-6d1f0c2b9e57")
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_point_id(filename: str, digest: str) -> str:
+    return str(uuid.uuid5(CHUNK_NAMESPACE, f"{filename}:{digest}"))
+
+
+class ChunkManifest:
+    """Per-file record of the chunk hashes (and point ids) stored in Qdrant."""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " filename TEXT NOT NULL,"
+            " chunk_hash TEXT NOT NULL,"
+            " point_id TEXT NOT NULL,"
+            " PRIMARY KEY (filename, chunk_hash))"
+        )
+        self._conn.commit()
+
+    def point_ids(self, filename: str) -> set[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT point_id FROM chunks WHERE filename = ?", (filename,)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def replace(self, filename: str, chunks: dict[str, str]):
+        """Set the file's manifest to ``chunks`` (chunk hash -> point id)."""
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks WHERE filename = ?", (filename,))
+            self._conn.executemany(
+                "INSERT INTO chunks (filename, chunk_hash, point_id) VALUES (?, ?, ?)",
+                [(filename, digest, point_id) for digest, point_id in chunks.items()]
+            )
+            self._conn.commit()
+
+    def delete(self, filename: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks WHERE filename = ?", (filename,))
+            self._conn.commit()
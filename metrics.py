@@ -0,0 +1,205 @@
+# metrics.py
+"""In-process counters, gauges and histograms in Prometheus text format.
+
+Dependency-free; one ``metrics`` registry per process. ``Timings`` collects
+the stage durations of a single chat request or ingested file, so they can
+be returned as a debugging breakdown and observed in ``rag_stage_seconds``.
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+import threading
+import time
+
+# Seconds; covers cache hits through slow LLM generations
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+
+def _label_key(labels: dict) -> tuple:
+    # Values are rendered as strings anyway; mixed types would break sorting
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: tuple, extra: tuple = ()) -> str:
+    items = key + extra
+    if not items:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in items
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._help = {}
+        self._types = {}
+        self._values = {}
+        self._histograms = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _declare(self, name: str, kind: str, help_text: str):
+        if name not in self._types:
+            self._types[name] = kind
+            self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1, help_text: str = "", **labels):
+        with self._lock:
+            self._declare(name, "counter", help_text)
+            key = (name, _label_key(labels))
+            self._values[key] = self._values.get(key, 0) + value
+
+    def gauge_add(self, name: str, delta: float, help_text: str = "", **labels):
+        with self._lock:
+            self._declare(name, "gauge", help_text)
+            key = (name, _label_key(labels))
+            self._values[key] = self._values.get(key, 0) + delta
+
+    def observe(self, name: str, seconds: float, help_text: str = "", **labels):
+        with self._lock:
+            self._declare(name, "histogram", help_text)
+            key = (name, _label_key(labels))
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {
+                    "buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0
+                }
+            index = bisect_left(self.buckets, seconds)
+            if index < len(self.buckets):
+                histogram["buckets"][index] += 1
+            histogram["sum"] += seconds
+            histogram["count"] += 1
+
+    @contextmanager
+    def in_flight(self, name: str, help_text: str = "", **labels):
+        self.gauge_add(name, 1, help_text, **labels)
+        try:
+            yield
+        finally:
+            self.gauge_add(name, -1, help_text, **labels)
+
+    def register_collector(self, collector):
+        """``collector()`` returns (name, type, help, labels, value) samples at scrape time."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        samples = {}
+        with self._lock:
+            types = dict(self._types)
+            helps = dict(self._help)
+            for (name, key), value in self._values.items():
+                samples.setdefault(name, []).append((key, value))
+            histograms = {
+                key: {**h, "buckets": list(h["buckets"])}
+                for key, h in self._histograms.items()
+            }
+
+        for collector in self._collectors:
+            try:
+                collected = collector()
+            except Exception:
+                # A component that isn't loaded yet has nothing to report
+                continue
+            for name, kind, help_text, labels, value in collected:
+                types.setdefault(name, kind)
+                helps.setdefault(name, help_text)
+                samples.setdefault(name, []).append((_label_key(labels), value))
+
+        lines = []
+        for name in sorted(types):
+            if helps.get(name):
+                lines.append(f"# HELP {name} {helps[name]}")
+            lines.append(f"# TYPE {name} {types[name]}")
+
+            if types[name] == "histogram":
+                for (metric, key), h in sorted(histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(self.buckets, h["buckets"]):
+                        cumulative += count
+                        lines.append(
+                            f"{name}_bucket{_format_labels(key, (('le', _format_value(bound)),))} "
+                            f"{cumulative}"
+                        )
+                    lines.append(f"{name}_bucket{_format_labels(key, (('le', '+Inf'),))} {h['count']}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {_format_value(h['sum'])}")
+                    lines.append(f"{name}_count{_format_labels(key)} {h['count']}")
+                continue
+
+            for key, value in sorted(samples.get(name, [])):
+                lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+class Timings:
+    """Stage durations of one chat request or ingested file.
+
+    Stages may be entered several times and from several threads; their
+    durations add up. ``finish`` observes the totals in ``rag_stage_seconds``.
+    """
+
+    def __init__(self, pipeline: str):
+        self.pipeline = pipeline
+        self.seconds = {}
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def wrap(self, stage: str, func):
+        def timed(*args, **kwargs):
+            with self.stage(stage):
+                return func(*args, **kwargs)
+        return timed
+
+    def iter(self, stage: str, iterable):
+        """Yield from ``iterable``, timing only the work of producing each item."""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(stage, time.perf_counter() - start)
+                return
+            self.add(stage, time.perf_counter() - start)
+            yield item
+
+    def finish(self) -> dict:
+        """Record the totals and return the breakdown in milliseconds."""
+        with self._lock:
+            seconds = dict(self.seconds)
+        for stage, value in seconds.items():
+            metrics.observe(
+                "rag_stage_seconds", value,
+                "Time spent per request or file in each pipeline stage",
+                pipeline=self.pipeline, stage=stage
+            )
+        breakdown = {f"{stage}_ms": round(1000 * value, 2) for stage, value in seconds.items()}
+        breakdown["total_ms"] = round(1000 * (time.perf_counter() - self._start), 2)
+        return breakdown
@@ -0,0 +1,105 @@
+# microbatch.py
+"""Coalesce concurrent single-item calls into batched calls.
+
+Requests submitted while a batch is being formed (or while the previous one
+is still running) are handled by one call to ``batch_fn``, and each caller
+gets its own result back. With no concurrent traffic a request waits at most
+``window_ms`` before running alone.
+"""
+import asyncio
+from concurrent.futures import Future
+import queue
+import threading
+import time
+
+
+class MicroBatcher:
+    """Runs ``batch_fn(items) -> results`` over items gathered from many threads.
+
+    ``max_batch`` <= 1 disables batching: ``run`` then calls ``batch_fn``
+    inline with a single item.
+    """
+
+    def __init__(self, batch_fn, window_ms: float = 5, max_batch: int = 32,
+                 workers: int = 1, name: str = "microbatch"):
+        self.batch_fn = batch_fn
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.enabled = max_batch > 1
+        self.batches = 0
+        self.items = 0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._workers = [
+            threading.Thread(target=self._worker, name=f"{name}-{i}", daemon=True)
+            for i in range(workers if self.enabled else 0)
+        ]
+        self._started = False
+
+    def _start(self):
+        with self._lock:
+            if not self._started:
+                for worker in self._workers:
+                    worker.start()
+                self._started = True
+
+    def submit(self, item) -> Future:
+        if not self._started:
+            self._start()
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def run(self, item):
+        if not self.enabled:
+            return self.batch_fn([item])[0]
+        return self.submit(item).result()
+
+    async def arun(self, item):
+        if not self.enabled:
+            return (await asyncio.to_thread(self.batch_fn, [item]))[0]
+        return await asyncio.wrap_future(self.submit(item))
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                # Whatever queued up during the previous batch is taken
+                # without waiting
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self):
+        while True:
+            batch = self._collect()
+            futures = [future for _, future in batch]
+            try:
+                results = self.batch_fn([item for item, _ in batch])
+                if len(results) != len(batch):
+                    raise ValueError(
+                        f"Batch function returned {len(results)} results for {len(batch)} items"
+                    )
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+
+            with self._lock:
+                self.batches += 1
+                self.items += len(batch)
+            for future, result in zip(futures, results):
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0
+        }
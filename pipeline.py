@@ -0,0 +1,138 @@
+# pipeline.py
+import queue
+import threading
+
+_DONE = object()
+_UNSET = object()
+
+
+def batched(iterable, size: int):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def prefetch(iterable, maxsize: int = 2):
+    """Iterate ``iterable`` on a background thread, buffering at most ``maxsize`` items.
+
+    Exceptions raised by the producer are re-raised in the consumer. Closing
+    the returned generator early stops the producer.
+    """
+    items = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(entry):
+        while not stop.is_set():
+            try:
+                items.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run():
+        try:
+            for item in iterable:
+                if not put((True, item)):
+                    return
+            put((True, _DONE))
+        except BaseException as e:
+            put((False, e))
+
+    threading.Thread(target=run, daemon=True, name="prefetch").start()
+
+    try:
+        while True:
+            ok, item = items.get()
+            if not ok:
+                raise item
+            if item is _DONE:
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+def iter_chunks(sections, splitter, header: str = "", flush_size: int = 8000):
+    """Split (page, text) sections into (page, chunk) pairs incrementally.
+
+    Text is buffered until ``flush_size`` characters, split, and every chunk
+    but the last is emitted; the last one seeds the next buffer so chunks
+    still flow across block boundaries. A change of page number flushes the
+    buffer completely so chunks never span pages.
+    """
+    buffer = header
+    current = _UNSET
+
+    for page, text in sections:
+        if current is not _UNSET and page != current:
+            for chunk in splitter.split_text(buffer):
+                yield current, chunk
+            buffer = ""
+        current = page
+        buffer += text
+
+        if len(buffer) >= flush_size:
+            chunks = splitter.split_text(buffer)
+            for chunk in chunks[:-1]:
+                yield page, chunk
+            trailing = buffer[len(buffer.rstrip()):]
+            buffer = chunks[-1] + trailing if chunks else ""
+
+    if current is not _UNSET:
+        for chunk in splitter.split_text(buffer):
+            yield current, chunk
+
+
+def iter_structured_chunks(units, splitter, chunk_size: int, header: str = ""):
+    """Pack (page, context, text) units into (page, chunk) pairs.
+
+    Consecutive units with the same page and context share a chunk of at
+    most ``chunk_size`` characters that starts with the context, so every
+    chunk of a table carries its column header. Units are only split when
+    one alone doesn't fit. ``header`` opens the first chunk.
+    """
+    pending_header = header
+    current = None
+    body, size = [], 0
+
+    def lead(context):
+        return pending_header + (f"{context}\n" if context else "")
+
+    for page, context, text in units:
+        text = text.strip()
+        if not text:
+            continue
+
+        if body and (
+            (page, context) != current
+            or size + len(text) + 1 > chunk_size - len(lead(current[1]))
+        ):
+            yield current[0], lead(current[1]) + "\n".join(body)
+            pending_header = ""
+            body, size = [], 0
+        current = (page, context)
+
+        if len(text) > chunk_size - len(lead(context)):
+            for piece in splitter.split_text(text):
+                yield page, lead(context) + piece
+                pending_header = ""
+            continue
+        body.append(text)
+        size += len(text) + 1
+
+    if body:
+        yield current[0], lead(current[1]) + "\n".join(body)
+
+
+def chunk_sections(sections, splitter, chunk_size: int, header: str = "",
+                   structured: bool = False):
+    """(page, chunk) pairs from an extractor's output, structured or plain."""
+    if structured:
+        return iter_structured_chunks(sections, splitter, chunk_size, header)
+    return iter_chunks(sections, splitter, header=header, flush_size=chunk_size * 8)
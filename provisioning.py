@@ -0,0 +1,226 @@
+# provisioning.py
+"""Single place where the Qdrant collection is created and configured.
+
+Storage options (all via environment variables):
+- QDRANT_QUANTIZATION: none | scalar (int8, ~4x less RAM) | binary (~32x)
+- QDRANT_ON_DISK_VECTORS: keep original float32 vectors on disk (only the
+  quantized copy stays in RAM; originals are read for rescoring)
+- HNSW_M / HNSW_EF_CONSTRUCT / HNSW_ON_DISK: index build parameters
+- HNSW_EF_SEARCH / QUANTIZATION_OVERSAMPLING / QUANTIZATION_RESCORE: search
+
+    python provisioning.py --apply            # update an existing collection
+    python provisioning.py --recall q.txt     # recall of quantized vs exact search
+"""
+import argparse
+import os
+
+from dotenv import load_dotenv
+from qdrant_client import QdrantClient, models
+
+from sparse import SPARSE_VECTOR_NAME
+
+load_dotenv()
+
+COLLECTION_NAME = os.getenv("COLLECTION_NAME", "Document")
+
+QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "none")
+QDRANT_ON_DISK_VECTORS = os.getenv("QDRANT_ON_DISK_VECTORS", "0") == "1"
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCT = int(os.getenv("HNSW_EF_CONSTRUCT", "100"))
+HNSW_ON_DISK = os.getenv("HNSW_ON_DISK", "0") == "1"
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "0"))
+QUANTIZATION_RESCORE = os.getenv("QUANTIZATION_RESCORE", "1") == "1"
+# Binary codes lose more information, so fetch more candidates to rescore
+QUANTIZATION_OVERSAMPLING = float(os.getenv(
+    "QUANTIZATION_OVERSAMPLING", "3.0" if QDRANT_QUANTIZATION == "binary" else "2.0"
+))
+
+
+def vectors_config(vector_size: int) -> models.VectorParams:
+    return models.VectorParams(
+        size=vector_size,
+        distance=models.Distance.COSINE,
+        on_disk=QDRANT_ON_DISK_VECTORS
+    )
+
+
+def sparse_vectors_config(hybrid: bool):
+    if not hybrid:
+        return None
+    return {
+        SPARSE_VECTOR_NAME: models.SparseVectorParams(modifier=models.Modifier.IDF)
+    }
+
+
+def quantization_config():
+    if QDRANT_QUANTIZATION == "scalar":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8,
+                quantile=0.99,
+                always_ram=True
+            )
+        )
+    if QDRANT_QUANTIZATION == "binary":
+        return models.BinaryQuantization(
+            binary=models.BinaryQuantizationConfig(always_ram=True)
+        )
+    if QDRANT_QUANTIZATION == "none":
+        return None
+    raise ValueError(f"Unknown QDRANT_QUANTIZATION: {QDRANT_QUANTIZATION}")
+
+
+def hnsw_config() -> models.HnswConfigDiff:
+    return models.HnswConfigDiff(
+        m=HNSW_M,
+        ef_construct=HNSW_EF_CONSTRUCT,
+        on_disk=HNSW_ON_DISK
+    )
+
+
+def search_params(exact: bool = False):
+    """Search params matching the collection's storage settings."""
+    quantization = None
+    if QDRANT_QUANTIZATION != "none":
+        quantization = models.QuantizationSearchParams(
+            ignore=exact,
+            rescore=QUANTIZATION_RESCORE,
+            oversampling=QUANTIZATION_OVERSAMPLING
+        )
+    if not (exact or quantization or HNSW_EF_SEARCH):
+        return None
+    return models.SearchParams(
+        hnsw_ef=HNSW_EF_SEARCH or None,
+        exact=exact,
+        quantization=quantization
+    )
+
+
+def create_collection(client: QdrantClient, name: str, vector_size: int, hybrid: bool):
+    client.create_collection(
+        collection_name=name,
+        vectors_config=vectors_config(vector_size),
+        sparse_vectors_config=sparse_vectors_config(hybrid),
+        quantization_config=quantization_config(),
+        hnsw_config=hnsw_config()
+    )
+    ensure_payload_indexes(client, name)
+
+
+def ensure_collection(client: QdrantClient, name: str, vector_size: int, hybrid: bool) -> bool:
+    """Create ``name`` if it doesn't exist; returns True when it was created.
+
+    New collections are created as ``<name>_v1`` behind the alias ``name``,
+    so reindex.py can later swap in a rebuilt version. A plain collection
+    called ``name`` from before aliases keeps working as is.
+    """
+    if alias_target(client, name) or client.collection_exists(name):
+        return False
+    version = versioned_name(name, 1)
+    create_collection(client, version, vector_size, hybrid)
+    point_alias(client, name, version)
+    return True
+
+
+def versioned_name(name: str, version: int) -> str:
+    return f"{name}_v{version}"
+
+
+def collection_versions(client: QdrantClient, name: str) -> list[tuple[int, str]]:
+    """(version, collection name) of every ``<name>_v<N>`` collection, oldest first."""
+    prefix = f"{name}_v"
+    versions = []
+    for collection in client.get_collections().collections:
+        suffix = collection.name[len(prefix):]
+        if collection.name.startswith(prefix) and suffix.isdigit():
+            versions.append((int(suffix), collection.name))
+    return sorted(versions)
+
+
+def alias_target(client: QdrantClient, alias: str):
+    """Collection the alias points to, or None."""
+    for item in client.get_aliases().aliases:
+        if item.alias_name == alias:
+            return item.collection_name
+    return None
+
+
+def point_alias(client: QdrantClient, alias: str, collection: str):
+    """Point ``alias`` at ``collection``; Qdrant applies both steps atomically."""
+    operations = []
+    if alias_target(client, alias):
+        operations.append(models.DeleteAliasOperation(
+            delete_alias=models.DeleteAlias(alias_name=alias)
+        ))
+    operations.append(models.CreateAliasOperation(
+        create_alias=models.CreateAlias(collection_name=collection, alias_name=alias)
+    ))
+    client.update_collection_aliases(change_aliases_operations=operations)
+
+
+def ensure_payload_indexes(client: QdrantClient, name: str):
+    client.create_payload_index(
+        collection_name=name,
+        field_name="filename",
+        field_schema=models.PayloadSchemaType.KEYWORD
+    )
+
+
+def apply_storage_settings(client: QdrantClient, name: str):
+    """Bring an existing collection in line with the configured storage options."""
+    client.update_collection(
+        collection_name=name,
+        vectors_config={"": models.VectorParamsDiff(on_disk=QDRANT_ON_DISK_VECTORS)},
+        quantization_config=quantization_config() or models.Disabled.DISABLED,
+        hnsw_config=hnsw_config()
+    )
+
+
+def measure_recall(client: QdrantClient, name: str, query_vectors, limit: int = 20) -> float:
+    """Mean overlap between configured (quantized) search and exact search."""
+    total = 0.0
+    for vector in query_vectors:
+        approximate = client.query_points(
+            collection_name=name, query=vector, limit=limit,
+            search_params=search_params()
+        ).points
+        exact = client.query_points(
+            collection_name=name, query=vector, limit=limit,
+            search_params=search_params(exact=True)
+        ).points
+        expected = {p.id for p in exact}
+        if expected:
+            total += len(expected & {p.id for p in approximate}) / len(expected)
+    return total / max(len(query_vectors), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Provision the Qdrant collection")
+    parser.add_argument("--apply", action="store_true",
+                        help="update storage settings of the existing collection")
+    parser.add_argument("--recall", metavar="QUERIES",
+                        help="file with one query per line; prints recall@limit")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    client = QdrantClient(
+        url=os.getenv("QDRANT_URL"),
+        api_key=os.getenv("QDRANT_API_KEY"),
+        check_compatibility=False
+    )
+
+    if args.apply:
+        apply_storage_settings(client, COLLECTION_NAME)
+        print(f"Applied storage settings to {COLLECTION_NAME}")
+
+    if args.recall:
+        from embeddings import embeddings
+        with open(args.recall) as f:
+            queries = [line.strip() for line in f if line.strip()]
+        vectors = embeddings.embed_documents(queries)
+        recall = measure_recall(client, COLLECTION_NAME, vectors, args.limit)
+        print(f"recall@{args.limit} vs exact search: {recall:.4f}")
+
+
+if __name__ == "__main__":
+    main()
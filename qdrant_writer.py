@@ -0,0 +1,132 @@
+# qdrant_writer.py
+from concurrent.futures import ThreadPoolExecutor, wait
+import logging
+import threading
+import time
+
+from qdrant_client import models
+
+logger = logging.getLogger(__name__)
+
+
+class BatchedWriter:
+    """Buffers points and upserts them in fixed-size batches.
+
+    Up to ``max_in_flight`` batches are sent concurrently with ``wait=False``
+    while the caller keeps producing points; ``add`` blocks once that limit
+    is reached. ``close`` drains everything and then issues one ``wait=True``
+    upsert, so when it returns every point has been applied. Each batch is
+    retried on its own with exponential backoff.
+    """
+
+    def __init__(self, client, collection_name: str, batch_size: int = 256,
+                 max_in_flight: int = 3, max_retries: int = 3, on_written=None):
+        self.client = client
+        self.collection_name = collection_name
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.on_written = on_written or (lambda count: None)
+        self.written = 0
+        # Summed across concurrent batches, retries included
+        self.upsert_seconds = 0.0
+        self.submitted_ids = []
+
+        self._buffer = []
+        self._last_point = None
+        self._futures = []
+        self._errors = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_in_flight,
+            thread_name_prefix="upsert"
+        )
+
+    def add(self, point: models.PointStruct):
+        self._buffer.append(point)
+        if len(self._buffer) >= self.batch_size:
+            self._submit()
+
+    def _submit(self):
+        batch, self._buffer = self._buffer, []
+        self.submitted_ids.extend(point.id for point in batch)
+        self._last_point = batch[-1]
+        self._slots.acquire()
+        self._futures.append(self._executor.submit(self._write, batch, False))
+
+    def _upsert(self, batch, wait_for_result):
+        start = time.perf_counter()
+        try:
+            self._upsert_with_retries(batch, wait_for_result)
+        finally:
+            with self._lock:
+                self.upsert_seconds += time.perf_counter() - start
+
+    def _upsert_with_retries(self, batch, wait_for_result):
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.client.upsert(
+                    collection_name=self.collection_name,
+                    points=batch,
+                    wait=wait_for_result
+                )
+                return
+            except Exception:
+                if attempt == self.max_retries:
+                    raise
+                delay = 0.5 * 2 ** attempt
+                logger.warning(
+                    "Upsert of %d points failed, retrying in %.1fs", len(batch), delay
+                )
+                time.sleep(delay)
+
+    def _write(self, batch, wait_for_result):
+        try:
+            self._upsert(batch, wait_for_result)
+            with self._lock:
+                self.written += len(batch)
+                written = self.written
+            self.on_written(written)
+        except Exception as e:
+            with self._lock:
+                self._errors.append(e)
+        finally:
+            self._slots.release()
+
+    def close(self) -> int:
+        """Write everything buffered, wait for acknowledgement, return points written."""
+        try:
+            wait(self._futures)
+            if self._errors:
+                raise RuntimeError(
+                    f"{len(self._errors)} upsert batch(es) failed: {self._errors[0]}"
+                )
+
+            # Updates are applied in order, so a final wait=True upsert
+            # confirms all the earlier fire-and-forget batches as well.
+            if self._buffer:
+                batch, self._buffer = self._buffer, []
+                self.submitted_ids.extend(point.id for point in batch)
+                self._upsert(batch, True)
+                self.written += len(batch)
+                self.on_written(self.written)
+            elif self._last_point is not None:
+                self._upsert([self._last_point], True)
+
+            return self.written
+        finally:
+            self._executor.shutdown(wait=False)
+
+    def abort(self):
+        """Stop writing and delete every point this writer sent."""
+        for future in self._futures:
+            future.cancel()
+        wait(self._futures)
+        self._executor.shutdown(wait=False)
+
+        ids = self.submitted_ids
+        for start in range(0, len(ids), self.batch_size):
+            self.client.delete(
+                collection_name=self.collection_name,
+                points_selector=models.PointIdsList(points=ids[start:start + self.batch_size])
+            )
@@ -0,0 +1,97 @@
+# registry.py
+import os
+import sqlite3
+import threading
+
+FIELDS = ("filename", "description", "upload_date", "chunk_count", "size_bytes")
+
+
+class DocumentRegistry:
+    """One row per ingested document, so listing never touches Qdrant."""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " filename TEXT PRIMARY KEY,"
+            " description TEXT NOT NULL DEFAULT '',"
+            " upload_date TEXT NOT NULL DEFAULT '',"
+            " chunk_count INTEGER NOT NULL DEFAULT 0,"
+            " size_bytes INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    def upsert(self, filename: str, description: str, upload_date: str,
+               chunk_count: int, size_bytes: int):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO documents (filename, description, upload_date,"
+                " chunk_count, size_bytes) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT(filename) DO UPDATE SET"
+                " description = excluded.description,"
+                " upload_date = excluded.upload_date,"
+                " chunk_count = excluded.chunk_count,"
+                " size_bytes = excluded.size_bytes",
+                (filename, description, upload_date, chunk_count, size_bytes)
+            )
+            self._conn.commit()
+
+    def add_missing(self, filename: str, description: str, upload_date: str,
+                    chunk_count: int, size_bytes: int) -> bool:
+        """Insert a row unless ``filename`` is already registered."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO documents (filename, description, upload_date,"
+                " chunk_count, size_bytes) VALUES (?, ?, ?, ?, ?)",
+                (filename, description, upload_date, chunk_count, size_bytes)
+            )
+            self._conn.commit()
+            return cursor.rowcount > 0
+
+    def get_flag(self, key: str) -> bool:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM meta WHERE key = ?", (key,)
+            ).fetchone() is not None
+
+    def set_flag(self, key: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, '1')", (key,)
+            )
+            self._conn.commit()
+
+    def delete(self, filename: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM documents WHERE filename = ?", (filename,))
+            self._conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def page(self, offset: int = 0, limit: int = 100) -> list[dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(FIELDS)} FROM documents"
+                " ORDER BY filename LIMIT ? OFFSET ?",
+                (limit, offset)
+            ).fetchall()
+
+        documents = []
+        for row in rows:
+            document = dict(zip(FIELDS, row))
+            document["size_kb"] = round(document["size_bytes"] / 1024, 2)
+            documents.append(document)
+        return documents
@@ -0,0 +1,630 @@
+# reindex.py
+"""Rebuild the collection in the background and swap it in without downtime.
+
+The app reads and writes COLLECTION_NAME, which is an alias for a versioned
+``<name>_v<N>`` collection. ``build`` creates the next version with the
+current chunking, embedding and storage settings. It indexes the source
+files kept in UPLOAD_FOLDER, catches up with uploads and deletes made in
+the meantime, and validates point counts and a sample of queries. With
+``--swap`` it then moves the alias. ``rollback`` moves the alias back to
+the previous version.
+
+    python reindex.py status
+    python reindex.py build --chunk-size 800 --chunk-overlap 100 \\
+        --max-chunks-per-second 200 --swap
+    python reindex.py swap Document_v3
+    python reindex.py rollback
+    python reindex.py prune --keep 2
+    python reindex.py compact-store   # with CHUNK_STORE=1
+
+Run the app with the same CHUNK_SIZE / CHUNK_OVERLAP afterwards so new
+uploads are chunked like the rebuilt ones. A different embedding model or
+HYBRID_SEARCH setting takes effect in the app after a (rolling) restart
+with the new settings.
+"""
+import argparse
+import os
+import random
+import time
+
+from dotenv import load_dotenv
+from qdrant_client import QdrantClient, models
+
+from chunk_store import ChunkStore
+from embeddings import embeddings
+from extractor import get_extractor, start_pdf_pool
+from manifest import ChunkManifest, chunk_hash, chunk_point_id
+from pipeline import batched, chunk_sections
+from provisioning import (
+    COLLECTION_NAME,
+    alias_target,
+    collection_versions,
+    create_collection,
+    point_alias,
+    versioned_name
+)
+from jobs import SwapLock
+from qdrant_writer import BatchedWriter
+from registry import DocumentRegistry
+from sparse import SPARSE_VECTOR_NAME
+from sparse import document_vector as sparse_document_vector
+
+load_dotenv()
+
+UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", "uploaded_files")
+MANIFEST_PATH = os.getenv("MANIFEST_PATH", "data/manifest.sqlite3")
+REGISTRY_PATH = os.getenv("REGISTRY_PATH", "data/registry.sqlite3")
+JOBS_FOLDER = os.getenv("JOBS_FOLDER", "jobs")
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1") == "1"
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+CHUNK_STORE = os.getenv("CHUNK_STORE", "0") == "1"
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "256"))
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "256"))
+UPSERT_IN_FLIGHT = int(os.getenv("UPSERT_IN_FLIGHT", "3"))
+
+# Shared with the app; point ids are content hashes, so every collection
+# version finds its texts under the same keys
+chunk_store = ChunkStore(
+    os.getenv("CHUNK_STORE_PATH", "data/chunks"),
+    compress=os.getenv("CHUNK_STORE_COMPRESS", "0") == "1"
+) if CHUNK_STORE else None
+
+# Passes over the registry to pick up uploads and deletes made during a build
+CATCH_UP_ROUNDS = 5
+
+
+class Throttle:
+    """Caps throughput at ``rate`` items per second (0 = unlimited)."""
+
+    def __init__(self, rate: float = 0):
+        self.rate = rate
+        self.items = 0
+        self._start = time.monotonic()
+
+    def wait(self, items: int):
+        if not self.rate:
+            return
+        self.items += items
+        ahead = self.items / self.rate - (time.monotonic() - self._start)
+        if ahead > 0:
+            time.sleep(ahead)
+
+
+def filename_filter(filename: str) -> models.Filter:
+    return models.Filter(must=[models.FieldCondition(
+        key="filename", match=models.MatchValue(value=filename)
+    )])
+
+
+def registry_records(registry: DocumentRegistry) -> dict:
+    return {r["filename"]: r for r in registry.page(0, max(registry.count(), 1))}
+
+
+def stored_signature(client: QdrantClient, collection: str):
+    """Embedding signature recorded in the collection's points, if any."""
+    points, _ = client.scroll(
+        collection_name=collection, with_payload=["embedding_model"],
+        with_vectors=False, limit=1
+    )
+    return (points[0].payload or {}).get("embedding_model") if points else None
+
+
+class ShadowBuilder:
+    """Indexes documents into the shadow collection.
+
+    Files with a source in UPLOAD_FOLDER are extracted, chunked and embedded
+    again. Files without one are copied from the live collection as they are,
+    which only works while the embedding model is unchanged.
+    """
+
+    def __init__(self, client: QdrantClient, live, shadow: str, splitter,
+                 chunk_size: int, hybrid: bool, throttle: Throttle):
+        self.client = client
+        self.live = live
+        self.shadow = shadow
+        self.splitter = splitter
+        self.chunk_size = chunk_size
+        self.hybrid = hybrid
+        self.throttle = throttle
+        self.can_copy = bool(live) and stored_signature(client, live) == embeddings.signature
+        self.file_chunks = {}
+        self.copied = []
+        self.missing = []
+
+    def _vector(self, dense, text):
+        if self.hybrid:
+            return {"": dense, SPARSE_VECTOR_NAME: sparse_document_vector(text)}
+        return dense
+
+    def _writer(self) -> BatchedWriter:
+        return BatchedWriter(
+            self.client, self.shadow,
+            batch_size=UPSERT_BATCH_SIZE, max_in_flight=UPSERT_IN_FLIGHT
+        )
+
+    def index_file(self, record: dict) -> int:
+        filename = record["filename"]
+        path = os.path.join(UPLOAD_FOLDER, filename)
+        if os.path.exists(path):
+            count = self._index_source(path, record)
+        elif self.can_copy:
+            count = self._copy_points(filename)
+            self.copied.append(filename)
+        else:
+            self.missing.append(filename)
+            return 0
+        self.file_chunks[filename] = count
+        return count
+
+    def remove_file(self, filename: str):
+        self.client.delete(
+            collection_name=self.shadow,
+            points_selector=models.FilterSelector(filter=filename_filter(filename))
+        )
+        self.file_chunks.pop(filename, None)
+        for names in (self.copied, self.missing):
+            if filename in names:
+                names.remove(filename)
+
+    def _index_source(self, path: str, record: dict) -> int:
+        filename = record["filename"]
+        ext = os.path.splitext(filename)[1].lower()
+        extractor, structured = get_extractor(ext)
+        chunks = chunk_sections(
+            extractor(path),
+            self.splitter,
+            self.chunk_size,
+            header=f"Description: {record['description']}\n\n",
+            structured=structured
+        )
+        seen = set()
+        writer = self._writer()
+        try:
+            for batch in batched(chunks, INGEST_BATCH_SIZE):
+                fresh = []
+                for page, chunk in batch:
+                    digest = chunk_hash(chunk)
+                    if digest not in seen:
+                        seen.add(digest)
+                        fresh.append((chunk_point_id(filename, digest), page, chunk))
+
+                self.throttle.wait(len(fresh))
+                vectors = embeddings.embed_documents([chunk for _, _, chunk in fresh])
+                if chunk_store is not None:
+                    chunk_store.put_many({point_id: chunk for point_id, _, chunk in fresh})
+                for (point_id, page, chunk), vector in zip(fresh, vectors):
+                    payload = {
+                        "text": chunk,
+                        "filename": filename,
+                        "description": record["description"],
+                        "upload_date": record["upload_date"],
+                        "embedding_model": embeddings.signature
+                    }
+                    if chunk_store is not None:
+                        payload = minimal_payload(payload)
+                    if page is not None:
+                        payload["page"] = page
+                    writer.add(models.PointStruct(
+                        id=point_id, vector=self._vector(vector, chunk), payload=payload
+                    ))
+            writer.close()
+        except Exception:
+            writer.abort()
+            raise
+        return len(seen)
+
+    def _copy_points(self, filename: str) -> int:
+        count = 0
+        offset = None
+        writer = self._writer()
+        try:
+            while True:
+                points, offset = self.client.scroll(
+                    collection_name=self.live,
+                    scroll_filter=filename_filter(filename),
+                    with_payload=True,
+                    with_vectors=True,
+                    limit=UPSERT_BATCH_SIZE,
+                    offset=offset
+                )
+                self.throttle.wait(len(points))
+                texts = point_texts(points)
+                if chunk_store is not None:
+                    # Copying moves payload text into the store
+                    chunk_store.put_many(texts)
+                for point in points:
+                    dense = point.vector.get("") if isinstance(point.vector, dict) else point.vector
+                    payload = point.payload
+                    if chunk_store is not None:
+                        payload = minimal_payload(payload)
+                    writer.add(models.PointStruct(
+                        id=point.id,
+                        vector=self._vector(dense, texts.get(str(point.id), "")),
+                        payload=payload
+                    ))
+                count += len(points)
+                if offset is None:
+                    break
+            writer.close()
+        except Exception:
+            writer.abort()
+            raise
+        return count
+
+
+def point_texts(points) -> dict:
+    """Chunk text per point id, from the payload or else the chunk store."""
+    texts = {str(point.id): point.payload["text"]
+             for point in points if (point.payload or {}).get("text")}
+    missing = [point.id for point in points if str(point.id) not in texts]
+    if missing and chunk_store is not None:
+        texts.update(chunk_store.get_many(missing))
+    return texts
+
+
+def minimal_payload(payload: dict) -> dict:
+    """Payload without the fields the chunk store and registry keep."""
+    return {key: value for key, value in payload.items()
+            if key not in ("text", "description", "upload_date")}
+
+
+def sample_queries(client: QdrantClient, collection: str, count: int, seed: int = 0) -> list:
+    """(query, expected filename) pairs cut from random chunks of ``collection``."""
+    points, _ = client.scroll(
+        collection_name=collection, with_payload=["text", "filename"],
+        with_vectors=False, limit=max(count * 10, 100)
+    )
+    rng = random.Random(seed)
+    queries = []
+    picked = rng.sample(points, min(count, len(points)))
+    texts = point_texts(picked)
+    for point in picked:
+        words = texts.get(str(point.id), "").split()
+        if not words:
+            continue
+        start = rng.randrange(max(len(words) - 12, 1))
+        queries.append((" ".join(words[start:start + 12]), point.payload["filename"]))
+    return queries
+
+
+def top_files(client: QdrantClient, collection: str, vector, limit: int) -> list:
+    points = client.query_points(
+        collection_name=collection, query=vector, limit=limit, with_payload=["filename"]
+    ).points
+    return [point.payload["filename"] for point in points]
+
+
+def validate(client: QdrantClient, builder: ShadowBuilder, records: dict, queries: list,
+             limit: int, min_hit_rate: float, min_overlap: float) -> list:
+    """Check the shadow collection; returns the problems found."""
+    problems = []
+    if builder.missing:
+        problems.append(
+            f"{len(builder.missing)} file(s) have no source in {UPLOAD_FOLDER} and the "
+            f"embedding model changed, so they could not be copied: {builder.missing[:5]}"
+        )
+
+    points = client.count(collection_name=builder.shadow, exact=True).count
+    expected = sum(builder.file_chunks.values())
+    print(f"Points: {points} (expected {expected})")
+    if points != expected:
+        problems.append(f"{builder.shadow} holds {points} points, expected {expected}")
+
+    empty = [
+        filename for filename in records
+        if filename not in builder.missing and not client.count(
+            collection_name=builder.shadow, count_filter=filename_filter(filename), exact=True
+        ).count
+    ]
+    if empty:
+        problems.append(f"{len(empty)} file(s) have no points: {empty[:5]}")
+
+    # Live results are only comparable when queries embed the same way
+    compare_live = builder.can_copy
+    hits, overlaps = 0, []
+    for query, expected_file in queries:
+        vector = embeddings.embed_query(query)
+        shadow_files = top_files(client, builder.shadow, vector, limit)
+        # Queries from a file only need to find something
+        found = expected_file in shadow_files if expected_file else bool(shadow_files)
+        if found:
+            hits += 1
+        if compare_live:
+            live_files = set(top_files(client, builder.live, vector, limit))
+            if live_files:
+                overlaps.append(len(live_files & set(shadow_files)) / len(live_files))
+
+    if queries:
+        hit_rate = hits / len(queries)
+        print(f"Sample queries: {len(queries)}, hit rate {hit_rate:.3f}")
+        if hit_rate < min_hit_rate:
+            problems.append(f"Query hit rate {hit_rate:.3f} is below {min_hit_rate}")
+    if overlaps:
+        overlap = sum(overlaps) / len(overlaps)
+        print(f"Top-{limit} file overlap with {builder.live}: {overlap:.3f}")
+        if overlap < min_overlap:
+            problems.append(f"File overlap with the live collection {overlap:.3f} is below {min_overlap}")
+    return problems
+
+
+def sync_metadata(client: QdrantClient, collection: str):
+    """Point the chunk manifest and registry chunk counts at ``collection``."""
+    manifest = ChunkManifest(MANIFEST_PATH)
+    registry = DocumentRegistry(REGISTRY_PATH)
+
+    chunks = {}
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection, with_payload=["filename", "text"],
+            with_vectors=False, limit=1000, offset=offset
+        )
+        texts = point_texts(points)
+        for point in points:
+            payload = point.payload or {}
+            if str(point.id) not in texts:
+                # Hashing "" would fold all such points onto one manifest entry
+                print(f"No text for point {point.id}; left out of the manifest")
+                continue
+            chunks.setdefault(payload.get("filename"), {})[
+                chunk_hash(texts[str(point.id)])
+            ] = str(point.id)
+        if offset is None:
+            break
+
+    for filename, record in registry_records(registry).items():
+        current = chunks.get(filename, {})
+        manifest.replace(filename, current)
+        registry.upsert(
+            filename,
+            description=record["description"],
+            upload_date=record["upload_date"],
+            chunk_count=len(current),
+            size_bytes=record["size_bytes"]
+        )
+
+
+def swap(client: QdrantClient, target: str, replace_legacy: bool = False, check=None):
+    """Move the alias to ``target`` while the app's ingestion is paused.
+
+    ``check()`` runs once ingestion is paused and may abort the swap.
+    """
+    if not client.collection_exists(target):
+        raise SystemExit(f"No collection named {target}")
+
+    with SwapLock(JOBS_FOLDER).swap(
+        on_wait=lambda: print("Waiting for running ingests to finish...")
+    ):
+        if check:
+            check()
+        _swap(client, target, replace_legacy)
+
+
+def _swap(client: QdrantClient, target: str, replace_legacy: bool):
+    if alias_target(client, COLLECTION_NAME) is None and client.collection_exists(COLLECTION_NAME):
+        if not replace_legacy:
+            raise SystemExit(
+                f"{COLLECTION_NAME} is a plain collection from before versioning. "
+                "Pass --replace-legacy to delete it and put the alias in its place "
+                "(it can't be rolled back to)."
+            )
+        client.delete_collection(COLLECTION_NAME)
+
+    point_alias(client, COLLECTION_NAME, target)
+    sync_metadata(client, target)
+    print(f"{COLLECTION_NAME} -> {target}")
+
+
+def make_client() -> QdrantClient:
+    return QdrantClient(
+        url=os.getenv("QDRANT_URL"),
+        api_key=os.getenv("QDRANT_API_KEY"),
+        timeout=int(os.getenv("QDRANT_TIMEOUT", "30")),
+        check_compatibility=False
+    )
+
+
+def live_collection(client: QdrantClient):
+    target = alias_target(client, COLLECTION_NAME)
+    if target is None and client.collection_exists(COLLECTION_NAME):
+        return COLLECTION_NAME
+    return target
+
+
+def pending_changes(records: dict, indexed: dict) -> tuple[list, list]:
+    """Records uploaded since ``indexed`` was taken, and filenames deleted since."""
+    changed = [r for f, r in records.items() if indexed.get(f) != r["upload_date"]]
+    removed = [f for f in indexed if f not in records]
+    return changed, removed
+
+
+def build(client: QdrantClient, args):
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    live = live_collection(client)
+    versions = collection_versions(client, COLLECTION_NAME)
+    shadow = versioned_name(COLLECTION_NAME, (versions[-1][0] if versions else 0) + 1)
+    print(f"Building {shadow} (live: {live or 'none'})")
+    create_collection(client, shadow, embeddings.embedding_size, HYBRID_SEARCH)
+
+    builder = ShadowBuilder(
+        client, live, shadow,
+        RecursiveCharacterTextSplitter(
+            chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap
+        ),
+        args.chunk_size, HYBRID_SEARCH, Throttle(args.max_chunks_per_second)
+    )
+    registry = DocumentRegistry(REGISTRY_PATH)
+
+    try:
+        indexed = {}
+        for _ in range(CATCH_UP_ROUNDS):
+            records = registry_records(registry)
+            changed, removed = pending_changes(records, indexed)
+            if not changed and not removed:
+                break
+            for filename in removed:
+                builder.remove_file(filename)
+            for record in changed:
+                if record["filename"] in indexed:
+                    builder.remove_file(record["filename"])
+                count = builder.index_file(record)
+                print(f"  {record['filename']}: {count} chunks")
+            indexed = {f: r["upload_date"] for f, r in records.items()}
+        else:
+            print("Documents were still changing; validating the current state")
+    except BaseException:
+        client.delete_collection(shadow)
+        raise
+
+    if builder.copied:
+        print(f"Copied {len(builder.copied)} file(s) without a stored source unchanged")
+
+    if args.queries:
+        with open(args.queries) as f:
+            queries = [(line.strip(), None) for line in f if line.strip()]
+    else:
+        queries = sample_queries(client, shadow, args.sample_queries)
+    problems = validate(
+        client, builder, records, queries, args.limit, args.min_hit_rate, args.min_overlap
+    )
+
+    if problems:
+        for problem in problems:
+            print(f"FAILED: {problem}")
+        print(f"{shadow} was kept for inspection; swap it anyway with "
+              f"'python reindex.py swap {shadow}' or drop it with 'prune'")
+        raise SystemExit(1)
+
+    print(f"{shadow} passed validation")
+    if args.swap:
+        def check():
+            # With ingestion paused, every upload and delete made while
+            # validating is in the registry; those only reached the live
+            # collection, so swapping would lose or resurrect them
+            changed, removed = pending_changes(registry_records(registry), indexed)
+            if changed or removed:
+                client.delete_collection(shadow)
+                raise SystemExit(
+                    f"{len(changed)} upload(s) and {len(removed)} delete(s) arrived during "
+                    f"validation; dropped {shadow}, run the build again"
+                )
+
+        swap(client, shadow, args.replace_legacy, check=check)
+
+
+def rollback(client: QdrantClient):
+    current = alias_target(client, COLLECTION_NAME)
+    versions = collection_versions(client, COLLECTION_NAME)
+    numbers = {name: version for version, name in versions}
+    if current not in numbers:
+        raise SystemExit(f"{COLLECTION_NAME} doesn't point at a versioned collection")
+    previous = [name for version, name in versions if version < numbers[current]]
+    if not previous:
+        raise SystemExit("No earlier version to roll back to")
+    swap(client, previous[-1])
+
+
+def prune(client: QdrantClient, keep: int):
+    """Delete all but the newest ``keep`` versions, never the live one."""
+    current = alias_target(client, COLLECTION_NAME)
+    versions = [name for _, name in collection_versions(client, COLLECTION_NAME)]
+    for name in versions[:max(len(versions) - keep, 0)]:
+        if name != current:
+            client.delete_collection(name)
+            print(f"Deleted {name}")
+
+
+def status(client: QdrantClient):
+    current = live_collection(client)
+    print(f"{COLLECTION_NAME} -> {current or 'nothing'}")
+    for _, name in collection_versions(client, COLLECTION_NAME):
+        count = client.count(collection_name=name, exact=False).count
+        marker = "*" if name == current else " "
+        print(f"{marker} {name}: ~{count} points")
+
+
+def referenced_point_ids(client: QdrantClient) -> set:
+    """Ids of the points in every version of the collection."""
+    names = [name for _, name in collection_versions(client, COLLECTION_NAME)]
+    if alias_target(client, COLLECTION_NAME) is None and client.collection_exists(COLLECTION_NAME):
+        names.append(COLLECTION_NAME)
+    ids = set()
+    for name in names:
+        offset = None
+        while True:
+            points, offset = client.scroll(
+                collection_name=name, with_payload=False, with_vectors=False,
+                limit=1000, offset=offset
+            )
+            ids.update(str(point.id) for point in points)
+            if offset is None:
+                break
+    return ids
+
+
+def compact_store(client: QdrantClient):
+    """Reclaim chunk store space of texts no collection version references."""
+    if chunk_store is None:
+        raise SystemExit("CHUNK_STORE is not enabled")
+    # Texts stored after this are kept: their points may not be written yet
+    started = time.time()
+    print(chunk_store.compact(referenced_point_ids(client), added_before=started))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Zero-downtime re-indexing")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("status", help="show the alias and collection versions")
+
+    build_parser = commands.add_parser("build", help="build and validate the next version")
+    build_parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    build_parser.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP)
+    build_parser.add_argument("--max-chunks-per-second", type=float, default=0,
+                              help="throttle embedding and writes (0 = unlimited)")
+    build_parser.add_argument("--queries", help="file with one validation query per line")
+    build_parser.add_argument("--sample-queries", type=int, default=50,
+                              help="queries cut from random chunks when --queries is not given")
+    build_parser.add_argument("--limit", type=int, default=10, help="top-k compared per query")
+    build_parser.add_argument("--min-hit-rate", type=float, default=0.8)
+    build_parser.add_argument("--min-overlap", type=float, default=0.5,
+                              help="minimum top-k file overlap with the live collection")
+    build_parser.add_argument("--swap", action="store_true", help="swap the alias if valid")
+    build_parser.add_argument("--replace-legacy", action="store_true")
+
+    swap_parser = commands.add_parser("swap", help="point the alias at a version")
+    swap_parser.add_argument("collection")
+    swap_parser.add_argument("--replace-legacy", action="store_true")
+
+    commands.add_parser("rollback", help="point the alias at the previous version")
+
+    prune_parser = commands.add_parser("prune", help="delete old versions")
+    prune_parser.add_argument("--keep", type=int, default=2)
+
+    commands.add_parser("compact-store",
+                        help="drop chunk store texts no collection version references")
+
+    args = parser.parse_args()
+    if args.command == "build":
+        # Before the writer threads start
+        start_pdf_pool()
+    client = make_client()
+
+    if args.command == "status":
+        status(client)
+    elif args.command == "build":
+        build(client, args)
+    elif args.command == "swap":
+        swap(client, args.collection, args.replace_legacy)
+    elif args.command == "rollback":
+        rollback(client)
+    elif args.command == "prune":
+        prune(client, args.keep)
+    elif args.command == "compact-store":
+        compact_store(client)
+
+
+if __name__ == "__main__":
+    main()
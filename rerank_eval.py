@@ -0,0 +1,64 @@
+# rerank_eval.py
+"""Compare reranker backends on a held-out set.
+
+Each line of the JSONL file is
+{"query": "...", "passages": ["...", ...], "relevant": [index, ...]}.
+
+    python rerank_eval.py heldout.jsonl --backends torch onnx onnx-int8 --keep 10
+"""
+import argparse
+import json
+import time
+
+from reranker import RERANK_MODEL, Reranker
+
+
+def evaluate(reranker: Reranker, examples: list[dict], keep: int) -> dict:
+    mrr = 0.0
+    recall = 0.0
+    elapsed = 0.0
+
+    for example in examples:
+        pairs = [(example["query"], passage) for passage in example["passages"]]
+        start = time.perf_counter()
+        scores = reranker.predict(pairs)
+        elapsed += time.perf_counter() - start
+
+        ranked = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:keep]
+        relevant = set(example["relevant"])
+        for rank, index in enumerate(ranked, start=1):
+            if index in relevant:
+                mrr += 1 / rank
+                break
+        if relevant:
+            recall += len(relevant & set(ranked)) / len(relevant)
+
+    n = len(examples) or 1
+    return {
+        "backend": reranker.backend,
+        f"mrr@{keep}": round(mrr / n, 4),
+        f"recall@{keep}": round(recall / n, 4),
+        "ms_per_query": round(1000 * elapsed / n, 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path")
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx-int8"])
+    parser.add_argument("--model", default=RERANK_MODEL)
+    parser.add_argument("--keep", type=int, default=10)
+    args = parser.parse_args()
+
+    with open(args.path) as f:
+        examples = [json.loads(line) for line in f if line.strip()]
+
+    for backend in args.backends:
+        reranker = Reranker(args.model, backend, cache_size=0)
+        # Warm up so model loading isn't timed
+        reranker.predict([("warmup", "warmup")])
+        print(json.dumps(evaluate(reranker, examples, args.keep)))
+
+
+if __name__ == "__main__":
+    main()
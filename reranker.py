@@ -0,0 +1,161 @@
+# reranker.py
+from collections import OrderedDict
+import hashlib
+import os
+import threading
+
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+# torch | onnx | onnx-int8
+RERANK_BACKEND = os.getenv("RERANK_BACKEND", "torch")
+RERANK_ONNX_INT8_FILE = os.getenv("RERANK_ONNX_INT8_FILE", "onnx/model_quint8_avx2.onnx")
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "50000"))
+
+# Adaptive mode: skip reranking when the dense top hit leads the runner-up
+# by SKIP_MARGIN, otherwise only rerank hits within WINDOW of the top score
+RERANK_ADAPTIVE = os.getenv("RERANK_ADAPTIVE", "0") == "1"
+RERANK_SKIP_MARGIN = float(os.getenv("RERANK_SKIP_MARGIN", "0.15"))
+RERANK_WINDOW = float(os.getenv("RERANK_WINDOW", "0.25"))
+
+
+def load_cross_encoder(model_name: str, backend: str):
+    # Imported here so reading the settings above doesn't load torch
+    from sentence_transformers import CrossEncoder
+
+    if backend == "torch":
+        return CrossEncoder(model_name)
+    if backend == "onnx":
+        return CrossEncoder(model_name, backend="onnx")
+    if backend == "onnx-int8":
+        return CrossEncoder(
+            model_name,
+            backend="onnx",
+            model_kwargs={"file_name": RERANK_ONNX_INT8_FILE}
+        )
+    raise ValueError(f"Unknown rerank backend: {backend}")
+
+
+class Reranker:
+    """CrossEncoder reranker with a (query, chunk id) score cache."""
+
+    def __init__(self, model_name: str = RERANK_MODEL, backend: str = RERANK_BACKEND,
+                 cache_size: int = RERANK_CACHE_SIZE):
+        self.model_name = model_name
+        self.backend = backend
+        self.model = load_cross_encoder(model_name, backend)
+        self.cache_size = cache_size
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.skipped = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def predict(self, pairs: list[tuple[str, str]]) -> list[float]:
+        if not pairs:
+            return []
+        return [float(score) for score in self.model.predict(pairs)]
+
+    def score(self, query: str, items: list[tuple[str, str]]) -> list[float]:
+        """Score (chunk_id, text) items against ``query``, reusing cached scores."""
+        return self.score_many([(query, items)])[0]
+
+    def score_many(self, requests: list[tuple[str, list[tuple[str, str]]]]) -> list[list[float]]:
+        """``score`` for several queries; all cache misses go through one forward pass."""
+        all_keys = []
+        for query, items in requests:
+            query_hash = hashlib.sha256(query.encode("utf-8")).hexdigest()
+            all_keys.append([(query_hash, str(chunk_id)) for chunk_id, _ in items])
+
+        scores = {}
+        with self._lock:
+            for keys in all_keys:
+                for key in keys:
+                    if key in self._cache:
+                        self._cache.move_to_end(key)
+                        scores[key] = self._cache[key]
+            total = sum(len(keys) for keys in all_keys)
+            self.cache_hits += len(scores)
+            self.cache_misses += total - len(scores)
+
+        missing = {}
+        for (query, items), keys in zip(requests, all_keys):
+            for key, (_, text) in zip(keys, items):
+                if key not in scores:
+                    missing.setdefault(key, (query, text))
+
+        if missing:
+            predicted = self.predict(list(missing.values()))
+            with self._lock:
+                for key, value in zip(missing, predicted):
+                    scores[key] = value
+                    self._cache[key] = value
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        return [[scores[key] for key in keys] for keys in all_keys]
+
+    def candidates(self, results, keep: int):
+        """Adaptive candidate selection over dense hits sorted by score.
+
+        Returns None when the dense ranking is decisive enough to skip the
+        CrossEncoder, otherwise the hits worth reranking.
+        """
+        if len(results) > 1 and results[0].score - results[1].score >= RERANK_SKIP_MARGIN:
+            return None
+        cutoff = results[0].score - RERANK_WINDOW
+        shortlisted = sum(1 for r in results if r.score >= cutoff)
+        return results[:max(keep, shortlisted)]
+
+    def rerank(self, query: str, results, keep: int, adaptive: bool = RERANK_ADAPTIVE):
+        """Order Qdrant hits by CrossEncoder score and return the top ``keep``.
+
+        Sets ``payload["rerank_score"]`` on every returned hit.
+        """
+        return self.rerank_many([(query, results, keep, adaptive)])[0]
+
+    def rerank_many(self, jobs):
+        """``rerank`` for several (query, results, keep, adaptive) jobs at once.
+
+        The pairs of every job are scored in a single batched forward pass.
+        """
+        outputs = [None] * len(jobs)
+        pending = []
+        for index, (query, results, keep, adaptive) in enumerate(jobs):
+            if not results:
+                outputs[index] = []
+                continue
+
+            candidates = self.candidates(results, keep) if adaptive else results
+            if candidates is None:
+                self.skipped += 1
+                top = results[:keep]
+                # Dense order is kept; expose the similarity as the score
+                for r in top:
+                    r.payload["rerank_score"] = float(r.score)
+                outputs[index] = top
+                continue
+
+            pending.append((index, query, candidates, keep))
+
+        all_scores = self.score_many([
+            (query, [(r.id, r.payload["text"]) for r in candidates])
+            for _, query, candidates, _ in pending
+        ])
+        for (index, _, candidates, keep), scores in zip(pending, all_scores):
+            for r, value in zip(candidates, scores):
+                r.payload["rerank_score"] = value
+            outputs[index] = sorted(
+                candidates, key=lambda x: x.payload["rerank_score"], reverse=True
+            )[:keep]
+
+        return outputs
+
+    def stats(self) -> dict:
+        total = self.cache_hits + self.cache_misses
+        return {
+            "backend": self.backend,
+            "cache_entries": len(self._cache),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "cache_hit_rate": round(self.cache_hits / total, 4) if total else 0.0,
+            "skipped": self.skipped
+        }
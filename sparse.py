@@ -0,0 +1,65 @@
+# sparse.py
+"""BM25-style sparse vectors computed locally.
+
+Documents get saturated term-frequency weights with length normalisation;
+Qdrant applies IDF at query time via ``Modifier.IDF`` on the sparse vector
+config. Tokens are hashed into a 32-bit index space, so no vocabulary has to
+be stored.
+"""
+from collections import Counter
+import os
+import re
+import zlib
+
+from qdrant_client import models
+
+SPARSE_VECTOR_NAME = "bm25"
+
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+# Typical chunk length in tokens, used for length normalisation
+BM25_AVG_LEN = float(os.getenv("BM25_AVG_LEN", "180"))
+
+# Keeps identifiers such as "e-1042", "v2.3.1" or "part_no" together
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+PART_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> list[str]:
+    tokens = []
+    for token in TOKEN_RE.findall(text.lower()):
+        tokens.append(token)
+        parts = PART_RE.findall(token)
+        # Compound identifiers are also indexed by their parts
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+def token_index(token: str) -> int:
+    return zlib.crc32(token.encode("utf-8"))
+
+
+def _hashed_counts(tokens: list[str]) -> Counter:
+    counts = Counter()
+    for token, count in Counter(tokens).items():
+        counts[token_index(token)] += count
+    return counts
+
+
+def document_vector(text: str) -> models.SparseVector:
+    tokens = tokenize(text)
+    length_norm = 1 - BM25_B + BM25_B * len(tokens) / BM25_AVG_LEN
+    counts = _hashed_counts(tokens)
+
+    indices = sorted(counts)
+    values = [
+        counts[i] * (BM25_K1 + 1) / (counts[i] + BM25_K1 * length_norm)
+        for i in indices
+    ]
+    return models.SparseVector(indices=indices, values=values)
+
+
+def query_vector(text: str) -> models.SparseVector:
+    indices = sorted(_hashed_counts(tokenize(text)))
+    return models.SparseVector(indices=indices, values=[1.0] * len(indices))
@@ -1,29 +1,60 @@
 import streamlit as st
 import requests
 import os
+import json
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from functools import wraps
 import socket
 from typing import List, Dict
 import logging
 
-import time
-time.sleep(3)
-
 logging.basicConfig(level=logging.INFO)
 logging.info("Starting Streamlit app")
 
 # Configuration
 FLASK_BACKEND = "http://127.0.0.1:5000"  # Flask backend address
-session = requests.Session()
-retries = requests.adapters.Retry(
-    total=3,
-    backoff_factor=1,
-    status_forcelist=[500, 502, 503, 504]
-)
-session.mount('http://', requests.adapters.HTTPAdapter(max_retries=retries))
+BACKEND_READY_TIMEOUT = float(os.getenv("BACKEND_READY_TIMEOUT", "120"))
+# Seconds the document list is reused before it is fetched again; uploads
+# and deletes from this app clear it right away
+DOCUMENTS_CACHE_TTL = float(os.getenv("DOCUMENTS_CACHE_TTL", "60"))
+# Files per /ingest request and requests sent at once
+UPLOAD_BATCH_SIZE = int(os.getenv("UPLOAD_BATCH_SIZE", "4"))
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "4"))
+
+@st.cache_resource
+def get_session() -> requests.Session:
+    """One keep-alive session per process, shared by every rerun and user"""
+    session = requests.Session()
+    retries = requests.adapters.Retry(
+        total=3,
+        backoff_factor=1,
+        status_forcelist=[500, 502, 503, 504]
+    )
+    adapter = requests.adapters.HTTPAdapter(
+        max_retries=retries,
+        pool_maxsize=max(UPLOAD_WORKERS, 10)
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+session = get_session()
 
 # Helper Functions
+def wait_for_backend(timeout: float = BACKEND_READY_TIMEOUT, poll_interval: float = 1.0) -> bool:
+    """Poll /readyz until the backend reports every component warm"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if session.get(f"{FLASK_BACKEND}/readyz", timeout=5).ok:
+                return True
+        except requests.exceptions.RequestException:
+            pass
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(poll_interval)
+
 def secure_filename(filename: str) -> str:
     """Sanitize filenames to prevent path traversal"""
     import re
@@ -52,50 +83,167 @@ def handle_connection_errors(func):
                 st.stop()
     return wrapper
 
+@st.cache_data(ttl=DOCUMENTS_CACHE_TTL, show_spinner=False)
+def fetch_documents(page_size: int = 1000) -> List[Dict]:
+    """Fetch all documents from backend, one page at a time"""
+    documents = []
+    while True:
+        response = session.get(
+            f"{FLASK_BACKEND}/list_files",
+            params={"offset": len(documents), "limit": page_size},
+            timeout=60
+        )
+        response.raise_for_status()
+        data = response.json()
+        files = data.get("files", [])
+        documents.extend(files)
+        if not files or len(documents) >= data.get("total", 0):
+            return documents
+
 @handle_connection_errors
 def get_documents() -> List[Dict]:
-    """Fetch all documents from backend"""
-    response = requests.get(f"{FLASK_BACKEND}/list_files", timeout=60)
-    response.raise_for_status()
-    return response.json().get("files", [])
+    """Document list, cached across reruns until it expires or is invalidated"""
+    return fetch_documents()
+
+def invalidate_documents():
+    """Forget the cached document list after an upload or delete"""
+    fetch_documents.clear()
 
 @handle_connection_errors
 def delete_document(filename: str) -> bool:
     """Delete a document by filename"""
-    response = requests.post(
+    response = session.post(
         f"{FLASK_BACKEND}/delete_file",
         json={"filename": filename},
         timeout=10
     )
     response.raise_for_status()
+    invalidate_documents()
     return True
 
-@handle_connection_errors
-def upload_documents(files_data, payload):
-    response = requests.post(
-        f"{FLASK_BACKEND}/save_vector",
+def post_ingestion(files_data, payload) -> str:
+    """Queue files for background ingestion and return the job id.
+
+    Undecorated so it can run in upload worker threads, which must not
+    touch Streamlit elements.
+    """
+    response = session.post(
+        f"{FLASK_BACKEND}/ingest",
         files=files_data,
         data=payload,
         timeout=60
     )
     response.raise_for_status()
+    return response.json()["job_id"]
+
+@handle_connection_errors
+def get_job(job_id: str) -> Dict:
+    """Fetch ingestion job progress"""
+    response = session.get(f"{FLASK_BACKEND}/jobs/{job_id}", timeout=10)
+    response.raise_for_status()
     return response.json()
 
+def iter_sse_events(response):
+    """Yield (event, data) pairs from a server-sent-events response"""
+    event, data_lines = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if not line:
+            if data_lines:
+                yield event, json.loads("\n".join(data_lines))
+            event, data_lines = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:"):].strip())
+
 @handle_connection_errors
-def chat_with_backend(query: str, selected_files: List[str]) -> Dict:
-    """Send chat query to backend"""
-    response = requests.post(
-        f"{FLASK_BACKEND}/chat",
+def stream_chat_with_backend(query: str, selected_files: List[str]):
+    """Send chat query to the streaming endpoint and return its event iterator"""
+    response = session.post(
+        f"{FLASK_BACKEND}/chat_stream",
         json={
             "query_text": query,
             "target_files": selected_files
         },
-        timeout=60
+        stream=True,
+        timeout=(10, 60)
     )
     response.raise_for_status()
-    return response.json()
+    return iter_sse_events(response)
 
 # UI Components
+def file_progress(f: Dict) -> float:
+    """Rough completion fraction for one file of an ingestion job"""
+    if f['status'] in ('done', 'failed'):
+        return 1.0
+    if not f['extracted']:
+        return 0.0
+    if not f['chunks_total']:
+        return 0.1
+    return 0.1 + 0.8 * f['chunks_embedded'] / f['chunks_total']
+
+def ingestion_request(uploaded_files, descriptions: List[str], indices: List[int]):
+    """Multipart files and descriptions for one /ingest batch"""
+    files_data = []
+    payload = {}
+    for position, i in enumerate(indices):
+        file = uploaded_files[i]
+        files_data.append((
+            "files", (file.name, file.getvalue(), file.type or 'application/octet-stream')))
+        payload[f"descriptions_{position}"] = descriptions[i]
+    return files_data, payload
+
+def upload_in_batches(uploaded_files, descriptions: List[str], bars: Dict) -> tuple:
+    """Send the files to /ingest in parallel batches.
+
+    Returns (job_id, file indices) per queued batch and the files whose
+    batch could not be queued.
+    """
+    batches = [
+        list(range(start, min(start + UPLOAD_BATCH_SIZE, len(uploaded_files))))
+        for start in range(0, len(uploaded_files), UPLOAD_BATCH_SIZE)
+    ]
+    jobs, failed = [], []
+    with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as pool:
+        futures = {
+            pool.submit(post_ingestion, *ingestion_request(uploaded_files, descriptions, indices)): indices
+            for indices in batches
+        }
+        # Progress bars are only touched from the script thread
+        for future in as_completed(futures):
+            indices = futures[future]
+            try:
+                job_id = future.result()
+            except Exception as e:
+                for i in indices:
+                    name = uploaded_files[i].name
+                    bars[i].progress(1.0, text=f"{name}: upload failed")
+                    failed.append({"filename": name, "error": str(e)})
+                continue
+            jobs.append((job_id, indices))
+            for i in indices:
+                bars[i].progress(0.0, text=f"{uploaded_files[i].name}: queued")
+    return jobs, failed
+
+def show_jobs_progress(jobs: List[tuple], bars: Dict, poll_interval: float = 1.0) -> List[Dict]:
+    """Poll ingestion jobs and render per-file progress until all finish"""
+    pending = dict(jobs)
+    finished = []
+    while pending:
+        for job_id, indices in list(pending.items()):
+            job = get_job(job_id)
+            for f in job['files']:
+                label = (f"{f['filename']}: {f['status']} "
+                         f"({f['chunks_embedded']}/{f['chunks_total']} chunks embedded, "
+                         f"{f['points_upserted']} stored)")
+                bars[indices[f['idx']]].progress(file_progress(f), text=label)
+            if job['status'] not in ('queued', 'running'):
+                finished.extend(job['files'])
+                del pending[job_id]
+        if pending:
+            time.sleep(poll_interval)
+    return finished
+
 def show_document_stats(documents: List[Dict]):
     """Display document statistics in sidebar"""
     if documents:
@@ -186,28 +334,43 @@ def document_management():
             
             if st.form_submit_button("Upload Documents"):
                 try:
-                    files_data = []
-                    payload = {}
-                    for i, file in enumerate(uploaded_files):
-                        files_data.append((
-                            "files",(file.name, file, file.type or 'application/octet-stream')))
-                        payload[f"descriptions_{i}"] = descriptions[i]
-                    
-                    with st.spinner("Uploading..."):
-                        result = upload_documents(files_data, payload)
-                    
-                    if result.get('failed_uploads'):
-                        st.error(f"{len(result['failed_uploads'])} files failed")
-                        for fail in result['failed_uploads']:
+                    bars = {
+                        i: st.progress(0.0, text=f"{file.name}: uploading")
+                        for i, file in enumerate(uploaded_files)
+                    }
+                    jobs, failed = upload_in_batches(uploaded_files, descriptions, bars)
+                    files = show_jobs_progress(jobs, bars)
+                    failed += [f for f in files if f['status'] == 'failed']
+                    succeeded = [f for f in files if f['status'] == 'done']
+
+                    if failed:
+                        st.error(f"{len(failed)} files failed")
+                        for fail in failed:
                             st.error(f"{fail['filename']}: {fail['error']}")
                     
-                    if result.get('successful_uploads'):
-                        st.success(f"Successfully uploaded {len(result['successful_uploads'])} files!")
+                    if succeeded:
+                        invalidate_documents()
+                        st.success(f"Successfully uploaded {len(succeeded)} files!")
                         time.sleep(1)
                         st.rerun()
                 except Exception as e:
                     st.error(f"Upload failed: {str(e)}")
 
+def show_sources(sources: List[Dict]):
+    if sources:
+        with st.expander("Sources"):
+            for source in sources:
+                st.write(f"**{source['filename']}** (relevance: {source['score']:.2f})")
+
+def show_chat_history(history: List[Dict]):
+    """Render earlier answers of this session without asking the backend again"""
+    for turn in history:
+        with st.chat_message("user"):
+            st.write(turn["question"])
+        with st.chat_message("assistant"):
+            st.write(turn["answer"])
+            show_sources(turn["sources"])
+
 def chat_with_documents():
     """Chat interface with document knowledge"""
     st.title("Chat with Your Documents")
@@ -222,15 +385,36 @@ def chat_with_documents():
                 default=filenames
             )
             
+            history = st.session_state.setdefault("chat_history", [])
+            if history:
+                show_chat_history(history)
+                if st.button("Clear chat"):
+                    history.clear()
+                    st.rerun()
+
             question = st.text_area("Ask a question:", height=150, 
                                   placeholder="What information are you looking for?")
             
             if st.button("Get Answer") and question:
                 with st.spinner("Analyzing documents..."):
-                    response = chat_with_backend(question, selected_files)
-                
+                    events = stream_chat_with_backend(question, selected_files)
+                    sources = []
+                    first = next(events, None)
+                    if first and first[0] == "sources":
+                        sources = first[1]
+
+                def answer_tokens():
+                    for event, data in events:
+                        if event == "token":
+                            yield data["text"]
+                        elif event == "error":
+                            raise RuntimeError(data["error"])
+
                 st.subheader("Answer")
-                st.markdown(response.get('answer', 'No answer returned from backend.'))
+                answer = st.write_stream(answer_tokens())
+                show_sources(sources)
+
+                history.append({"question": question, "answer": answer, "sources": sources})
                 
                 # if st.checkbox("Show source references"):
                 #     st.subheader("Source Materials")
@@ -252,6 +436,13 @@ def main():
         initial_sidebar_state="expanded"
     )
     
+    # Checked once per session instead of sleeping at import
+    if "backend_ready" not in st.session_state:
+        with st.spinner("Waiting for the backend to warm up..."):
+            st.session_state["backend_ready"] = wait_for_backend()
+        if not st.session_state["backend_ready"]:
+            st.warning("Backend is not ready yet; the first requests may be slow or fail.")
+
     st.sidebar.title("Navigation")
     page = st.sidebar.radio("Go to", ["Document Management", "Chat with Documents"])
     
@@ -0,0 +1,213 @@
+# uploads.py
+"""Resumable chunked uploads.
+
+A client creates an upload, appends parts at explicit byte offsets (each
+with an optional SHA-256), and finalizes it. Parts are streamed straight
+into ``<folder>/<upload_id>.part``; the committed offset lives in SQLite, so
+after a dropped connection or a restart the client asks for the offset and
+continues from there. Bytes past the committed offset (a part that never
+finished) are truncated before the next append.
+"""
+from datetime import datetime, timedelta
+import errno
+import hashlib
+import os
+import sqlite3
+import threading
+import uuid
+
+FIELDS = ("id", "filename", "description", "size", "sha256", "received", "created_at")
+# Read size when streaming a part to disk
+BLOCK_SIZE = 1024 * 1024
+
+
+class UploadError(Exception):
+    """Rejected upload request; ``status`` is the HTTP status to answer with."""
+
+    def __init__(self, message: str, status: int = 400, **details):
+        super().__init__(message)
+        self.status = status
+        self.details = details
+
+
+class UploadStore:
+    """SQLite-backed upload sessions with their part files in ``folder``."""
+
+    def __init__(self, folder: str, max_part_bytes: int = 64 * 1024 * 1024,
+                 expiry_hours: float = 24):
+        self.folder = folder
+        self.max_part_bytes = max_part_bytes
+        self.expiry = timedelta(hours=expiry_hours)
+        os.makedirs(folder, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # One append or finalize at a time per upload
+        self._upload_locks = {}
+        self._conn = sqlite3.connect(
+            os.path.join(folder, "uploads.sqlite3"), check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS uploads ("
+            " id TEXT PRIMARY KEY,"
+            " filename TEXT NOT NULL,"
+            " description TEXT NOT NULL DEFAULT '',"
+            " size INTEGER,"
+            " sha256 TEXT,"
+            " received INTEGER NOT NULL DEFAULT 0,"
+            " created_at TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    def part_path(self, upload_id: str) -> str:
+        return os.path.join(self.folder, f"{upload_id}.part")
+
+    def _upload_lock(self, upload_id: str) -> threading.Lock:
+        with self._lock:
+            return self._upload_locks.setdefault(upload_id, threading.Lock())
+
+    def _forget(self, upload_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM uploads WHERE id = ?", (upload_id,))
+            self._conn.commit()
+            self._upload_locks.pop(upload_id, None)
+
+    def create(self, filename: str, description: str = "", size: int = None,
+               sha256: str = None) -> dict:
+        """Start an upload of ``size`` bytes (if known) whose digest is ``sha256``."""
+        if size is not None and size < 0:
+            raise UploadError("size must not be negative")
+        self.purge_expired()
+
+        upload_id = uuid.uuid4().hex
+        open(self.part_path(upload_id), "wb").close()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO uploads (id, filename, description, size, sha256, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (upload_id, filename, description, size,
+                 sha256.lower() if sha256 else None, datetime.utcnow().isoformat())
+            )
+            self._conn.commit()
+        return self.get(upload_id)
+
+    def get(self, upload_id: str) -> dict:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(FIELDS)} FROM uploads WHERE id = ?", (upload_id,)
+            ).fetchone()
+        if row is None:
+            raise UploadError("Unknown upload", 404)
+        upload = dict(zip(FIELDS, row))
+        return {
+            "upload_id": upload.pop("id"),
+            "offset": upload.pop("received"),
+            **upload
+        }
+
+    def append(self, upload_id: str, offset: int, stream, length: int = None,
+               sha256: str = None) -> dict:
+        """Write the part read from ``stream`` at ``offset``.
+
+        ``offset`` must equal the committed offset; otherwise 409 with the
+        offset to resume from. A part whose digest doesn't match ``sha256``
+        is discarded.
+        """
+        if length is not None and length > self.max_part_bytes:
+            raise UploadError(f"Parts are limited to {self.max_part_bytes} bytes", 413)
+
+        with self._upload_lock(upload_id):
+            upload = self.get(upload_id)
+            if offset != upload["offset"]:
+                raise UploadError("Offset mismatch", 409, offset=upload["offset"])
+
+            digest = hashlib.sha256()
+            written = 0
+            with open(self.part_path(upload_id), "r+b") as f:
+                f.truncate(offset)
+                f.seek(offset)
+                while True:
+                    block = stream.read(BLOCK_SIZE)
+                    if not block:
+                        break
+                    written += len(block)
+                    if written > self.max_part_bytes:
+                        f.truncate(offset)
+                        raise UploadError(
+                            f"Parts are limited to {self.max_part_bytes} bytes", 413
+                        )
+                    digest.update(block)
+                    f.write(block)
+
+                received = offset + written
+                if upload["size"] is not None and received > upload["size"]:
+                    f.truncate(offset)
+                    raise UploadError("Part runs past the declared size", 400,
+                                      offset=offset)
+                if sha256 and digest.hexdigest() != sha256.lower():
+                    f.truncate(offset)
+                    raise UploadError("Part checksum mismatch", 400, offset=offset)
+                f.flush()
+                os.fsync(f.fileno())
+
+            with self._lock:
+                self._conn.execute(
+                    "UPDATE uploads SET received = ? WHERE id = ?", (received, upload_id)
+                )
+                self._conn.commit()
+        return {**upload, "offset": received}
+
+    def finalize(self, upload_id: str, destination: str) -> dict:
+        """Check size and digest, then move the file to ``destination``.
+
+        The move is a rename, so ``destination`` must be on the same
+        filesystem as the upload folder.
+        """
+        with self._upload_lock(upload_id):
+            upload = self.get(upload_id)
+            path = self.part_path(upload_id)
+            if upload["size"] is not None and upload["offset"] != upload["size"]:
+                raise UploadError("Upload incomplete", 409, offset=upload["offset"])
+
+            if upload["sha256"]:
+                digest = hashlib.sha256()
+                with open(path, "rb") as f:
+                    for block in iter(lambda: f.read(BLOCK_SIZE), b""):
+                        digest.update(block)
+                if digest.hexdigest() != upload["sha256"]:
+                    raise UploadError("File checksum mismatch", 400)
+
+            # The committed offset is authoritative; drop any unfinished part
+            os.truncate(path, upload["offset"])
+            try:
+                os.replace(path, destination)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                raise UploadError(
+                    "The upload folder and the jobs folder are on different "
+                    "filesystems; put CHUNKED_UPLOADS_FOLDER under JOBS_FOLDER",
+                    500
+                )
+            self._forget(upload_id)
+        return upload
+
+    def abort(self, upload_id: str):
+        self.get(upload_id)
+        with self._upload_lock(upload_id):
+            if os.path.exists(self.part_path(upload_id)):
+                os.remove(self.part_path(upload_id))
+            self._forget(upload_id)
+
+    def purge_expired(self) -> int:
+        cutoff = (datetime.utcnow() - self.expiry).isoformat()
+        with self._lock:
+            ids = [r[0] for r in self._conn.execute(
+                "SELECT id FROM uploads WHERE created_at < ?", (cutoff,)
+            )]
+        for upload_id in ids:
+            try:
+                self.abort(upload_id)
+            except UploadError:
+                pass
+        return len(ids)
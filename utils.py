@@ -1,15 +1,13 @@
 # utils.py
 
 from qdrant_client import QdrantClient
-from qdrant_client.http.models import VectorParams
+from provisioning import COLLECTION_NAME, ensure_collection
 
 # Ensure the Qdrant collection exists
-def ensure_collection_exists(qdrant_client: QdrantClient):
-    try:
-        qdrant_client.get_collection("Document")
-    except Exception:
-        qdrant_client.create_collection(
-            collection_name="Document",
-            vectors_config=VectorParams(size=1536, 
-                                        distance="Cosine"),
-        )
+def ensure_collection_exists(qdrant_client: QdrantClient, vector_size: int = None,
+                             hybrid: bool = True):
+    if vector_size is None:
+        from embeddings import embeddings
+        vector_size = embeddings.embedding_size
+
+    ensure_collection(qdrant_client, COLLECTION_NAME, vector_size, hybrid)